@@ -0,0 +1,64 @@
+# -*- coding:utf-8 -*-
+"""
+import time and class construction, e.g. Gardrail classes generated per tenant with type().
+
+    $ python benchmarks/classes.py
+"""
+import sys
+import timeit
+import subprocess
+from gardrail import Gardrail, NG, single, multi, container, collection
+
+N = 120  # validators per schema
+
+
+def nonnegative(self, *values):
+    if min(values) < 0:
+        return NG("negative")
+
+
+def schema_attrs(n=N):
+    attrs = {}
+    for i in range(n):
+        attrs["f{}".format(i)] = single("f{}".format(i))(nonnegative)
+        attrs["m{}".format(i)] = multi(["f{}".format(i), "f{}".format((i + 1) % n)])(nonnegative)
+    attrs["nested"] = container(type("nested", (object, ), {"x": single("x")(nonnegative)}))
+    attrs["items"] = collection(type("items", (object, ), {"x": single("x")(nonnegative)}))
+    return attrs
+
+Base = type("Base", (Gardrail, ), schema_attrs())
+params = dict(("f{}".format(i), i) for i in range(N))
+
+
+def generated_schemas(count):
+    # each tenant has its own validators
+    return [type("Tenant{}".format(i), (Gardrail, ), schema_attrs()) for i in range(count)]
+
+
+def tenant_subclasses(count):
+    # tenants share the validators of a base schema, with a few settings
+    return [type("Tenant{}".format(i), (Base, ), {"max_errors": i % 10 + 1}) for i in range(count)]
+
+
+def first_calls(classes):
+    for cls in classes:
+        cls()(params)
+
+
+def import_time(repeat=5):
+    code = "import time; t = time.time(); import gardrail; print(time.time() - t)"
+    return min(float(subprocess.check_output([sys.executable, "-c", code])) for _ in range(repeat))
+
+
+if __name__ == "__main__":
+    print("import gardrail: {:.2f}ms".format(import_time() * 1e3))
+    count = 200
+    cases = [
+        ("{} schemas x {} validators".format(count, 2 * N + 2), lambda: generated_schemas(count)),
+        ("{} subclasses of a schema".format(count), lambda: tenant_subclasses(count)),
+    ]
+    print("{:<36} {:>14} {:>14}".format("case", "classes/s", "+1st call/s"))
+    for name, make in cases:
+        t0 = min(timeit.repeat(make, number=1, repeat=3))
+        t1 = min(timeit.repeat(lambda: first_calls(make()), number=1, repeat=3))
+        print("{:<36} {:>14.0f} {:>14.0f}".format(name, count / t0, count / t1))
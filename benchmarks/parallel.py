@@ -0,0 +1,45 @@
+# -*- coding:utf-8 -*-
+"""
+scaling of validate_many(workers=N) with CPU bound validators.
+
+    $ python benchmarks/parallel.py [records]
+"""
+import os
+import sys
+import time
+from gardrail import Gardrail, NG, share, single, matched, collection
+
+
+class Palette(Gardrail):
+    @collection
+    class colors:
+        @share(single("r", strict=True),
+               single("g", strict=True),
+               single("b", strict=True))
+        def range(self, value):
+            if not (0 <= value <= 255):
+                return NG("invalid color: {}".format(value))
+
+        @matched(["r", "g", "b"], path="__all__")
+        def brightness(self, values):
+            # some cpu bound work
+            if sum(v * v for v in values for _ in range(20)) < 0:
+                return NG("too dark")
+
+
+def records(n):
+    for i in range(n):
+        yield {"colors": [{"r": i % 256, "g": (i * 7) % 256, "b": (i * 13) % 300} for _ in range(20)]}
+
+if __name__ == "__main__":
+    n = int(sys.argv[1]) if len(sys.argv) > 1 else 20000
+    rail = Palette()
+    base = None
+    print("{:>8} {:>12} {:>8}".format("workers", "records/s", "scaling"))
+    for workers in [None] + list(range(1, (os.cpu_count() or 1) + 1)):
+        st = time.time()
+        for _ in rail.validate_many(records(n), workers=workers, chunksize=500):
+            pass
+        rate = n / (time.time() - st)
+        base = base or rate
+        print("{:>8} {:>12.0f} {:>7.2f}x".format(workers or "-", rate, rate / base))
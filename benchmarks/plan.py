@@ -0,0 +1,83 @@
+# -*- coding:utf-8 -*-
+"""
+success path: interpreting validators vs compiled plan.
+
+    $ python benchmarks/plan.py
+"""
+import timeit
+from gardrail import Gardrail, NG, multi, matched, single, container, collection, subrail
+
+
+def positive(self, values):
+    for value in values:
+        if value < 0:
+            return NG("negative")
+
+
+def equals(self, x, y):
+    if x != y:
+        return NG("oops")
+
+
+class PointGardrail(Gardrail):
+    positive = matched(["x", "y", "z"], path="__all__")(positive)
+    equals = multi(["x", "y"], path="x")(equals)
+
+
+class PairGardrail(Gardrail):
+    left = subrail("left")(PointGardrail)
+    right = subrail("right")(PointGardrail)
+
+    @container
+    class center:
+        positive = matched(["x", "y", "z"], path="__all__")(positive)
+        equals = multi(["x", "y"], path="x")(equals)
+
+
+class PointListGardrail(Gardrail):
+    @collection
+    class points:
+        positive = matched(["x", "y", "z"], path="__all__")(positive)
+        equals = multi(["x", "y"], path="x")(equals)
+
+
+class WideGardrail(Gardrail):
+    pass
+
+for i in range(30):
+    setattr(WideGardrail, "f{}".format(i), single("f{}".format(i))(lambda self, v: None if v >= 0 else NG("negative")))
+
+
+class SharedFieldsGardrail(Gardrail):
+    pass
+
+for i in range(30):
+    names = ["f{}".format(j % 10) for j in range(i, i + 3)]
+    setattr(SharedFieldsGardrail, "m{}".format(i), multi(names)(lambda self, *values: None if min(values) >= 0 else NG("negative")))
+
+
+def interpreted(cls):
+    class Interpreted(cls):
+        def validate_context(self, context):
+            for v in self.validators:
+                v.validate_context(context)
+    return Interpreted
+
+D = {"x": 10, "y": 10, "z": 10}
+cases = [
+    ("point", PointGardrail, D),
+    ("pair", PairGardrail, {"left": D, "right": D, "center": D}),
+    ("points[100]", PointListGardrail, {"points": [D] * 100}),
+    ("wide[30]", WideGardrail, dict(("f{}".format(i), i) for i in range(30))),
+    ("shared[30x3]", SharedFieldsGardrail, dict(("f{}".format(i), i) for i in range(10))),
+]
+
+if __name__ == "__main__":
+    print("{:<14} {:>14} {:>14} {:>8}".format("case", "interpreted/s", "compiled/s", "speedup"))
+    for name, cls, params in cases:
+        slow, fast = interpreted(cls)(), cls()
+        assert slow(params) == fast(params)
+        n = 2000
+        t0 = min(timeit.repeat(lambda: slow(params), number=n, repeat=3))
+        t1 = min(timeit.repeat(lambda: fast(params), number=n, repeat=3))
+        print("{:<14} {:>14.0f} {:>14.0f} {:>7.2f}x".format(name, n / t0, n / t1, t0 / t1))
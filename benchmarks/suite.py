@@ -0,0 +1,296 @@
+# -*- coding:utf-8 -*-
+"""
+benchmark suite, ops/sec and peak memory of each case, compared with a stored baseline.
+
+    $ python benchmarks/suite.py                   # compare with benchmarks/baseline.json
+    $ python benchmarks/suite.py --save            # store the results as the baseline
+    $ python benchmarks/suite.py -k collection --max-size 10000
+
+exit status is 1 if a case is slower than the baseline by more than --threshold (0.25 by default).
+the baseline is machine dependent, save it again on the machine gating changes.
+"""
+import os
+import re
+import sys
+import gc
+import json
+import timeit
+import argparse
+import copy
+from gardrail import Gardrail, NG, Failure, multi, matched, single, container, collection, dispatch, dispatch_on, share, convert
+
+try:
+    import tracemalloc
+except ImportError:  # py2
+    tracemalloc = None
+
+BASELINE = os.path.join(os.path.dirname(os.path.abspath(__file__)), "baseline.json")
+
+
+def positive(self, values):
+    for value in values:
+        if value < 0:
+            return NG("negative")
+
+
+def equals(self, x, y):
+    if x != y:
+        return NG("oops")
+
+
+def nonnegative(self, *values):
+    if min(values) < 0:
+        return NG("negative")
+
+
+# Multi/Matched on wide dicts
+class WideGardrail(Gardrail):
+    everything = matched(["f{}".format(i) for i in range(100)], path="__all__")(positive)
+
+for i in range(100):
+    setattr(WideGardrail, "f{}".format(i), single("f{}".format(i))(nonnegative))
+    setattr(WideGardrail, "m{}".format(i), multi(["f{}".format(i), "f{}".format((i + 1) % 100)])(nonnegative))
+
+
+# deep container nesting, like examples/point.py:ABCDEFG
+def nested(depth):
+    attrs = {"check": single("v")(nonnegative)}
+    for i in range(depth):
+        attrs = {"inner": container(type("inner", (object, ), attrs))}
+    return type("DeepGardrail", (Gardrail, ), attrs)
+
+
+def nested_params(depth, value):
+    params = {"v": value}
+    for i in range(depth):
+        params = {"inner": params}
+    return params
+
+
+class PointListGardrail(Gardrail):
+    @collection
+    class points:
+        positive = matched(["x", "y", "z"], path="__all__")(positive)
+        equals = multi(["x", "y"], path="x")(equals)
+
+
+class CompactPointListGardrail(PointListGardrail):
+    compact_errors = True
+
+
+# Dispatch recursion, like examples/rec.py:Balanced
+class Balanced(Gardrail):
+    @multi(["min", "max"])
+    def balanced(self, min, max):
+        if min > max:
+            return NG("not {} < {}".format(min, max))
+
+    @dispatch()
+    def rec(self, check, params):
+        for i, child in enumerate(params.get("children", ())):
+            check(self, child, path=["children", i])
+
+
+def tree(depth, width, broken=False):
+    params = {"min": 1, "max": 100}
+    if depth > 0:
+        params["children"] = [tree(depth - 1, width, broken) for _ in range(width)]
+    elif broken:
+        params["min"] = 1000
+    return params
+
+
+# polymorphic events, 40 variants
+variants = dict(("event{}".format(i), type("Event{}".format(i), (Gardrail, ), {
+    "a": single("a{}".format(i))(nonnegative), "b": single("b")(nonnegative)})) for i in range(40))
+
+
+class Events(Gardrail):
+    @dispatch()
+    def kind(self, check, params):
+        for name, cls in sorted(variants.items()):
+            if params["type"] == name:
+                return check(cls(), params)
+
+
+class EventsOn(Gardrail):
+    kind = dispatch_on("type", variants)
+
+
+# convert on a large document, keeping the input
+class Document(Gardrail):
+    @convert(["title"])
+    def normalize(self, params):
+        params["title"] = params["title"].strip()
+
+    @collection
+    class points:
+        positive = matched(["x", "y", "z"], path="__all__")(positive)
+
+
+class DeepCopiedDocument(Document):
+    def configure(self, params):
+        return copy.deepcopy(params), {}
+
+
+class CopyOnWriteDocument(Document):
+    copy_on_write = True
+
+
+# repeated line items, checked by a costly validator
+SKU = re.compile(r"^(?:[A-Z]{2,4}-){1,3}[0-9]{3,}$")
+
+
+def sku(self, sku):
+    for _ in range(20):  # e.g. checksums, lookups
+        if not SKU.match(sku):
+            return NG("invalid sku")
+
+
+class LineItems(Gardrail):
+    @collection
+    class items:
+        positive = matched(["price", "qty"], path="__all__")(positive)
+        sku = single("sku")(sku)
+
+
+class CachedLineItems(Gardrail):
+    @collection
+    class items:
+        subtree_cache = 64
+        positive = matched(["price", "qty"], path="__all__")(positive)
+        sku = single("sku")(sku)
+
+
+# share fan-out
+class ColorTriple(Gardrail):
+    @share(*[single(c) for c in ["r", "g", "b", "a", "h", "s", "v", "l"]])
+    def range(self, value):
+        if not (0 <= value <= 255):
+            return NG("invalid color: {}".format(value))
+
+
+def point(i, broken=False):
+    return {"x": -i if broken else i, "y": -i if broken else i, "z": i}
+
+
+def cases(max_size):
+    D = nested_params
+    wide = dict(("f{}".format(i), i) for i in range(100))
+    yield "multi/wide[100]", WideGardrail(), wide
+    yield "multi/wide[100]:failure", WideGardrail(), dict(wide, f3=-1, f50=-1)
+    Deep = nested(7)
+    yield "container/deep[7]", Deep(), D(7, 1)
+    yield "container/deep[7]:failure", Deep(), D(7, -1)
+    Deeper = nested(50)
+    yield "container/deep[50]", Deeper(), D(50, 1)
+    for size in [10, 100, 1000, 10000, 100000, 1000000]:
+        if size > max_size:
+            break
+        yield "collection[{}]".format(size), PointListGardrail(), {"points": [point(i) for i in range(size)]}
+        yield "collection[{}]:failure".format(size), PointListGardrail(), {"points": [point(i, i % 10 == 0) for i in range(size)]}
+        if size >= 10000:  # every element fails
+            broken = {"points": [point(i + 1, True) for i in range(size)]}
+            yield "collection[{}]:all-failing".format(size), PointListGardrail(), broken
+            yield "collection[{}]:all-failing:compact".format(size), CompactPointListGardrail(), broken
+    yield "dispatch/balanced[4x4]", Balanced(), tree(4, 4)
+    yield "dispatch/balanced[4x4]:failure", Balanced(), tree(4, 4, broken=True)
+    event = {"type": "event39", "a39": 1, "b": 1}
+    yield "dispatch/events[40]", Events(), event
+    yield "dispatch_on/events[40]", EventsOn(), event
+    yield "dispatch_on/events[40]:failure", EventsOn(), dict(event, b=-1)
+    document = {"title": " title ", "points": [point(i) for i in range(1000)]}
+    yield "convert/deepcopy[1000]", DeepCopiedDocument(), document
+    yield "convert/copy_on_write[1000]", CopyOnWriteDocument(), document
+    items = {"items": [{"sku": "AB-CD-{:03}".format(i % 10), "price": 100, "qty": 1} for i in range(1000)]}
+    yield "subtree/uncached[1000]", LineItems(), items
+    yield "subtree/cached[1000]", CachedLineItems(), items
+    item = items["items"][0]
+    yield "subtree/cached-identical[1000]", CachedLineItems(), {"items": [item] * 1000}
+    colors = dict((c, 100) for c in "rgbahsvl")
+    yield "share/fanout[8]", ColorTriple(), colors
+    yield "share/fanout[8]:failure", ColorTriple(), dict(colors, r=300, v=-1)
+
+
+def call(rail, params):
+    try:
+        rail(params)
+    except Failure:
+        pass
+
+
+def measure(rail, params, duration=0.2, repeat=3):
+    fn = lambda: call(rail, params)  # NOQA
+    fn()  # compiling the plan
+    number = 1
+    while True:
+        elapsed = timeit.timeit(fn, number=number)
+        if elapsed >= duration / repeat or number >= 1 << 20:
+            break
+        number *= 2 if elapsed == 0 else max(2, min(10, int(duration / repeat / elapsed) + 1))
+    best = min(timeit.repeat(fn, number=number, repeat=repeat))
+
+    peak = None
+    if tracemalloc is not None:
+        gc.collect()
+        tracemalloc.start()
+        fn()
+        peak = tracemalloc.get_traced_memory()[1]
+        tracemalloc.stop()
+    return {"ops": number / best, "peak": peak}
+
+
+def compare(results, baseline, threshold):
+    regressions = []
+    for name, result in results.items():
+        previous = baseline.get(name)
+        if previous and result["ops"] < previous["ops"] * (1 - threshold):
+            regressions.append(name)
+    return regressions
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="gardrail benchmark suite")
+    parser.add_argument("-k", dest="keyword", default="", help="only cases including the keyword")
+    parser.add_argument("--max-size", type=int, default=1000000, help="the largest collection")
+    parser.add_argument("--baseline", default=BASELINE)
+    parser.add_argument("--save", action="store_true", help="storing the results as the baseline")
+    parser.add_argument("--threshold", type=float, default=0.25, help="allowed slowdown, as a ratio")
+    parser.add_argument("--duration", type=float, default=0.2, help="seconds measured for each case")
+    args = parser.parse_args(argv)
+
+    baseline = {}
+    if os.path.exists(args.baseline):
+        with open(args.baseline) as rf:
+            baseline = json.load(rf)
+
+    results = {}
+    print("{:<34} {:>12} {:>10} {:>12} {:>8}".format("case", "ops/sec", "baseline", "peak(KiB)", "ratio"))
+    for name, rail, params in cases(args.max_size):
+        if args.keyword not in name:
+            continue
+        result = results[name] = measure(rail, params, duration=args.duration)
+        previous = baseline.get(name)
+        peak = "-" if result["peak"] is None else "{:.1f}".format(result["peak"] / 1024.0)
+        if previous:
+            print("{:<34} {:>12.1f} {:>10.1f} {:>12} {:>7.2f}x".format(
+                name, result["ops"], previous["ops"], peak, result["ops"] / previous["ops"]))
+        else:
+            print("{:<34} {:>12.1f} {:>10} {:>12} {:>8}".format(name, result["ops"], "-", peak, "-"))
+        sys.stdout.flush()
+
+    if args.save:
+        baseline.update(results)
+        with open(args.baseline, "w") as wf:
+            json.dump(baseline, wf, indent=2, sort_keys=True)
+            wf.write("\n")
+        return 0
+
+    regressions = compare(results, baseline, args.threshold)
+    for name in regressions:
+        sys.stderr.write("regression: {}\n".format(name))
+    return 1 if regressions else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,99 @@
+# -*- coding:utf-8 -*-
+"""
+throughput of one Gardrail instance shared by threads, e.g. in a threaded WSGI server.
+
+    $ python benchmarks/threads.py
+    $ python3.13t benchmarks/threads.py  # free-threaded build
+
+with the GIL, the total throughput stays around the single thread one.
+"""
+import sys
+import time
+import threading
+import argparse
+from gardrail import Gardrail, NG, Failure, multi, matched, single, container, collection, dispatch_on
+
+
+def nonnegative(self, *values):
+    if min(values) < 0:
+        return NG("negative")
+
+
+class Point(Gardrail):
+    @multi(["x", "y"])
+    def balanced(self, x, y):
+        if x > y:
+            return NG("x > y")
+
+
+class Shape(Gardrail):
+    kind = dispatch_on("kind", {"point": Point})
+    name = single("name")(lambda self, name: None if name else NG("empty"))
+
+    @collection
+    class points:
+        positive = matched(["x", "y", "z"], path="__all__")(lambda self, values: None if min(values) >= 0 else NG("negative"))
+        x = single("x")(nonnegative)
+
+    @container
+    class style:
+        width = single("width")(nonnegative)
+
+
+def document(i):
+    return {"kind": "point", "x": 1, "y": 2, "name": "shape{}".format(i),
+            "points": [{"x": j, "y": j, "z": -1 if i % 10 == 0 and j == 0 else j} for j in range(20)],
+            "style": {"width": 1}}
+
+
+def run(rail, documents, threads, duration):
+    counts = [0] * threads
+    start = threading.Event()
+    stop = []
+
+    def worker(n):
+        start.wait()
+        count = 0
+        while not stop:
+            for params in documents:
+                try:
+                    rail(params)
+                except Failure:
+                    pass
+            count += len(documents)
+        counts[n] = count
+
+    workers = [threading.Thread(target=worker, args=(n, )) for n in range(threads)]
+    for t in workers:
+        t.start()
+    t0 = time.time()
+    start.set()
+    time.sleep(duration)
+    stop.append(True)
+    for t in workers:
+        t.join()
+    return sum(counts) / (time.time() - t0)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="gardrail throughput with threads")
+    parser.add_argument("--threads", default="1,2,4,8", help="comma separated numbers of threads")
+    parser.add_argument("--duration", type=float, default=1.0, help="seconds measured for each case")
+    args = parser.parse_args(argv)
+
+    gil = getattr(sys, "_is_gil_enabled", lambda: True)()
+    print("python {} (GIL {})".format(sys.version.split()[0], "enabled" if gil else "disabled"))
+    rail = Shape()
+    documents = [document(i) for i in range(100)]
+    base = None
+    print("{:>8} {:>12} {:>8}".format("threads", "ops/sec", "scaling"))
+    for threads in [int(n) for n in args.threads.split(",")]:
+        ops = run(rail, documents, threads, args.duration)
+        base = base or ops
+        print("{:>8} {:>12.1f} {:>7.2f}x".format(threads, ops, ops / base))
+        sys.stdout.flush()
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -1,27 +1,121 @@
 # -*- coding:utf-8 -*-
 import sys
 import logging
+import linecache
+import threading
+import weakref
+import contextlib
 logger = logging.getLogger(__name__)
 from functools import partial
+from itertools import islice, count
+from operator import attrgetter
+from collections import namedtuple, OrderedDict, deque
+from .compat import literal_types, iscoroutinefunction, iscoroutine, numpy, Mapping, perf_counter
+from .overlay import Overlay, materialize
 
 
 # 本当はnamedtupleみたいなものがほしい
 class Context(object):
-    def __init__(self, ob, scope, status, params, errors, path):
+    def __init__(self, ob, scope, status, params, errors, path, batching=False, collector=None, traversal=None,
+                 subtrees=None):
         self.ob = ob
         self.scope = scope
         self.status = status
         self.params = params
         self.errors = errors
         self.path = path
+        self.batching = batching  # top level Batched validators are called per batch, by validate_many()
+        self.collector = collector  # if not None, validators are timed (see gardrail.instrument)
+        self.traversal = traversal  # the explicit stack of Dispatch and Subrail, while they are validated
+        self.subtrees = subtrees  # the results of subtrees validated in this call (see gardrail.subtree)
+        self.spare = None  # the Traversal reused by traverse()
+
+    __slots__ = ("ob", "scope", "status", "params", "errors", "path", "batching", "collector", "traversal", "subtrees",
+                 "spare")
+
+
+_free_contexts = deque()  # contexts of successful calls, reused by __call__()
+MAX_FREE_CONTEXTS = 32
+
+
+def acquire_context(rail, ob, params, budget):
+    try:
+        context = _free_contexts.pop()
+    except IndexError:
+        return Context(ob=ob, scope=rail, status=_Status(True, budget), params=params, errors=rail.make_errors(),
+                       path=[], collector=rail.collector)
+    context.ob = ob
+    context.scope = rail
+    context.status.status = True
+    context.status.budget = budget
+    context.params = params
+    context.collector = rail.collector
+    if rail.compact_errors:
+        context.errors = rail.make_errors()
+    return context
+
+
+def release_context(context):
+    # a context having no errors (and an empty path) can be reused, without references to the validated data
+    if context.errors.__class__ is not Errors or context.path or len(_free_contexts) >= MAX_FREE_CONTEXTS:
+        return
+    context.ob = context.scope = context.params = context.collector = context.subtrees = None
+    _free_contexts.append(context)
+
+
+def fork_context(context, params, path):
+    """a context having its own params, path, errors and status (the error budget is copied)"""
+    status = _Status(True, context.status.budget)
+    return Context(ob=context.ob, scope=context.scope, status=status, params=params, errors=Errors(), path=path,
+                   batching=context.batching, collector=context.collector)
+
+
+def merge_errors(context, entries, spent=False, prefix=(), origins=None):
+    """adding the errors found with a forked context, under the error budget"""
+    status = context.status
+    for path, msg in entries:
+        if status.budget == 0:
+            return
+        status(False)
+        context.errors.add(prefix + path, msg)
+        if origins:
+            key = origins.get((path, message(msg)))
+            if key is not None:
+                context.errors.origin(prefix + path, msg, prefix + key)
+        if status.budget is not None:
+            status.budget -= 1
+    if spent:  # Interrupt, or the budget is spent
+        status.budget = 0
+
+
+def subtree_cache(option, owner=None):
+    # True: by identity in a call, N: also by structure across calls (LRU of N)
+    if not option:
+        return None
+    from .subtree import SubtreeCache, shared_cache
+    if owner is not None:  # subrails of a Gardrail share the cache
+        return shared_cache(owner, None if option is True else option)
+    return SubtreeCache(None if option is True else option)
+
 
-    __slots__ = ("ob", "scope", "status", "params", "errors", "path")
+# the result of each record of Gardrail.validate_many()
+Result = namedtuple("Result", "index ok params errors")
 
 
 class Failure(Exception):
     @property
     def errors(self):
-        return self.args[0]
+        errors = self.args[0]
+        if isinstance(errors, Errors):
+            return errors.as_dict()
+        return errors
+
+    def summary(self):
+        """the errors grouped by path and message (see CompactErrors)"""
+        errors = self.args[0]
+        if isinstance(errors, Errors):
+            return errors.summary()
+        return Errors.summary(errors_from_dict(errors))
 
     def __repr__(self):
         return "Failure[{!r}]".format(self.errors)
@@ -42,25 +136,352 @@ class Interrupt(NG):
     pass
 
 
+class Message(object):
+    """a message formatted when it is read"""
+
+    def __init__(self, fmt, *args):
+        self.fmt = fmt
+        self.args = args
+
+    def __str__(self):
+        return self.fmt.format(*self.args)
+
+    def __repr__(self):
+        return repr(str(self))
+
+    def __reduce__(self):
+        # formatted before pickling, the args may not be picklable (e.g. validator functions)
+        return (Message, ("{}", str(self)))
+
+
+def message(msg):
+    if isinstance(msg, Message):
+        return str(msg)
+    return msg
+
+
+class ErrorTree(dict):
+    """the nested dict of errors, keeping the origins of errors (see Errors.origin())"""
+    origins = None
+
+
+class Errors(Mapping):
+    """errors recorded as a flat list of (path, message), the nested dict is built when it is read"""
+    origins = None  # {(path, message): the key of the validator}, for errors reported at other paths
+
+    def __init__(self):
+        self.entries = []
+        self.tree = None
+
+    def add(self, path, msg):
+        self.entries.append((path, msg))
+        self.tree = None
+
+    def origin(self, path, msg, key):
+        """recording the validator of an error reported at another path, for revalidate()"""
+        if self.origins is None:
+            self.origins = {}
+        self.origins[(path, message(msg))] = key
+
+    @property
+    def count(self):
+        return len(self.entries)
+
+    def flat(self):
+        for path, msg in self.entries:
+            yield path, message(msg)
+
+    def compact(self, cap=100, samples=10):
+        errors = CompactErrors(cap=cap, samples=samples)
+        for path, msg in self.entries:
+            errors.add(path, msg)
+        return errors
+
+    def summary(self):
+        return self.compact().summary()
+
+    def as_dict(self):
+        if self.tree is None:
+            tree = {}
+            if self.origins:
+                tree = ErrorTree()
+                tree.origins = self.origins
+            for path, msg in self.entries:
+                target = tree
+                for p in path[:-1]:
+                    try:
+                        target = target[p]
+                    except KeyError:
+                        target[p] = target = {}
+                try:
+                    target[path[-1]].append(message(msg))
+                except KeyError:
+                    target[path[-1]] = [message(msg)]
+            self.tree = tree
+        return self.tree
+
+    def __getitem__(self, k):
+        return self.as_dict()[k]
+
+    def __iter__(self):
+        return iter(self.as_dict())
+
+    def __len__(self):
+        return len(self.as_dict())
+
+    def __bool__(self):
+        return bool(self.entries)
+    __nonzero__ = __bool__
+
+    def __repr__(self):
+        return repr(self.as_dict())
+
+
+class _Index(object):
+    def __repr__(self):
+        return "*"
+
+INDEX = _Index()  # the index of an element, in the paths of CompactErrors
+
+
+class ErrorGroup(object):
+    """the indices of elements having the same error, as ranges"""
+
+    def __init__(self, pattern, msg, cap, samples):
+        self.pattern = pattern
+        self.msg = msg
+        self.count = 0
+        self.ranges = []  # [prefix, start, stop], the last index is in range(start, stop)
+        self.samples = []
+        self.cap = cap
+        self.sample_size = samples
+        self.truncated = False
+
+    def add(self, indices):
+        self.count += 1
+        if len(self.samples) < self.sample_size:
+            self.samples.append(indices)
+        ranges = self.ranges
+        if not indices:
+            if not ranges:
+                ranges.append([(), None, None])
+            return
+        prefix, i = indices[:-1], indices[-1]
+        if ranges:
+            last = ranges[-1]
+            if last[2] == i and last[0] == prefix:
+                last[2] = i + 1
+                return
+        if len(ranges) < self.cap:
+            ranges.append([prefix, i, i + 1])
+        else:
+            self.truncated = True
+
+    def indices(self):
+        for prefix, start, stop in self.ranges:
+            if start is None:
+                for _ in range(self.count):
+                    yield prefix
+            else:
+                for i in range(start, stop):
+                    yield prefix + (i, )
+
+    def paths(self):
+        pattern = self.pattern
+        for indices in self.indices():
+            it = iter(indices)
+            yield tuple(next(it) if p is INDEX else p for p in pattern)
+
+
+class CompactErrors(Errors):
+    """errors grouped by (path without the indices of elements, message), for massively failing collections
+
+    each group keeps the count, the indices as ranges (at most cap ranges) and a few samples.
+    flat() and as_dict() expand them into the shape of Errors (ranges over the cap are dropped).
+    """
+
+    def __init__(self, cap=100, samples=10):
+        self.groups = OrderedDict()
+        self.cap = cap
+        self.samples = samples
+        self.n = 0
+        self.tree = None
+
+    def add(self, path, msg):
+        pattern = tuple([INDEX if p.__class__ is int else p for p in path])
+        key = (pattern, message(msg) if isinstance(msg, Message) else msg)
+        group = self.groups.get(key)
+        if group is None:
+            group = self.groups[key] = ErrorGroup(pattern, key[1], self.cap, self.samples)
+        group.add(tuple([p for p in path if p.__class__ is int]))
+        self.n += 1
+        self.tree = None
+
+    @property
+    def count(self):
+        return self.n
+
+    @property
+    def entries(self):
+        return [(path, group.msg) for group in self.groups.values() for path in group.paths()]
+
+    def compact(self, cap=100, samples=10):
+        return self
+
+    def summary(self):
+        """[{"path", "message", "count", "ranges", "samples", "truncated"}], "*" in the path is the index of an element"""
+        return [{"path": tuple("*" if p is INDEX else p for p in group.pattern), "message": message(group.msg),
+                 "count": group.count, "ranges": [tuple(r) for r in group.ranges if r[1] is not None],
+                 "samples": list(group.samples), "truncated": group.truncated}
+                for group in self.groups.values()]
+
+    def __bool__(self):
+        return self.n > 0
+    __nonzero__ = __bool__
+
+
+def error_key(validator):
+    """the path of the errors of a validator, unless NG has its own path"""
+    path = getattr(validator, "path", None)
+    if not path:
+        return (validator.names[0], )
+    if isinstance(path, (list, tuple)):
+        return tuple(path)
+    return (path, )
+
+
+def present(params, names):
+    # same as all(params.get(name) is not None for name in names), without a generator
+    for name in names:
+        if params.get(name) is None:
+            return False
+    return True
+
+
 def is_validator(v):
     return hasattr(v, "_v_count")
 
 
 class Counter(object):
+    # used when validators are defined, not while validating
     def __init__(self):
-        self.i = 0
+        self.i = count(1)
+        self.lock = threading.Lock()
 
     def __call__(self):
-        self.i += 1
-        return self.i
+        with self.lock:  # next() of count is not atomic without the GIL
+            return next(self.i)
 
 counter = Counter()
 
 
+def class_validators(cls):
+    validators = [v for v in cls.__dict__.values() if is_validator(v)]
+    validators.sort(key=attrgetter("_v_count"))
+    return validators
+
+
+def scheduled_validators(cls, validators):
+    # with scheduled = True, validators are ordered by their dependencies (see gardrail.schedule)
+    if not getattr(cls, "scheduled", False):
+        return validators
+    from .schedule import Schedule
+    return Schedule(validators)
+
+
+def is_schedule(validators):
+    return validators.__class__ is not list and hasattr(validators, "levels")
+
+
+def reject_coroutine(v, result):
+    # an async validator called without avalidate(), e.g. on the thread pool
+    result.close()
+    raise TypeError("{} is async, use avalidate()".format(getattr(v.method, "__name__", v.method)))
+
+
+def validate_all(context, validators):
+    """validating the validators of a level in order, until the error budget is spent"""
+    if is_schedule(validators):
+        return validators.run(context)
+    for v in validators:
+        v.validate_context(context)
+        if context.status.budget == 0:
+            return
+
+
+CacheInfo = namedtuple("CacheInfo", "hits misses evictions maxsize currsize")
+
+
+def typed_key(values):
+    # 1, 1.0 and True are equal, but a validator may tell them apart (as lru_cache(typed=True))
+    return tuple([(v.__class__, v) for v in values])
+
+
+class Memo(object):
+    """memoizing a pure validator by its arguments, with bounded LRU eviction
+
+    unhashable arguments are not cached.
+    """
+
+    def __init__(self, method, maxsize=128, key=None):
+        if iscoroutinefunction(method):
+            raise ValueError("async validator cannot be cached: {!r}".format(method))
+        self.method = method
+        self.__name__ = method.__name__
+        self.maxsize = maxsize
+        self.key = key
+        self.cache = OrderedDict()
+        self.lock = threading.Lock()
+        self.hits = self.misses = self.evictions = 0
+
+    def __call__(self, scope, *args):
+        key = typed_key(args) if self.key is None else self.key(args)
+        try:
+            with self.lock:
+                result = self.cache.pop(key)
+                self.cache[key] = result
+                self.hits += 1
+            return result
+        except KeyError:
+            pass
+        except TypeError:  # unhashable
+            return self.method(scope, *args)
+
+        result = self.method(scope, *args)
+        with self.lock:
+            self.misses += 1
+            self.cache[key] = result
+            if len(self.cache) > self.maxsize:
+                self.cache.popitem(last=False)
+                self.evictions += 1
+        return result
+
+    def __repr__(self):
+        return repr(self.method)
+
+    def cache_info(self):
+        return CacheInfo(self.hits, self.misses, self.evictions, self.maxsize, len(self.cache))
+
+    def cache_clear(self):
+        with self.lock:
+            self.cache.clear()
+            self.hits = self.misses = self.evictions = 0
+
+
+def memoize(method, cache, key=None):
+    if not cache or isinstance(method, Memo):
+        return method
+    return Memo(method, maxsize=cache, key=key)
+
+
+def cache_size(pure, cache):
+    return cache or (128 if pure else None)
+
+
 class Multi(object):
-    def __init__(self, names, method, msg=None, path=None, strict=False):
+    def __init__(self, names, method, msg=None, path=None, strict=False, cache=None):
         self.names = names
-        self.method = method
+        self.method = memoize(method, cache)
         self._v_count = counter()
         self.msg = msg
         self.path = path
@@ -68,8 +489,12 @@ class Multi(object):
 
     def validate_context(self, context):
         params = context.params
-        if all(params.get(name) is not None for name in self.names):
-            result = self.method(context.scope, *(params[name] for name in self.names))
+        if present(params, self.names):
+            names = self.names
+            if len(names) == 1:
+                result = self.method(context.scope, params.get(names[0]))
+            else:
+                result = self.method(context.scope, *[params.get(name) for name in names])
             context.scope.dispatch(context, self, result)
         else:
             if self.strict:
@@ -77,41 +502,186 @@ class Multi(object):
                 context.scope.dispatch(context, self, ng)
             logger.debug("names=%s not found", self.names)
 
+    def emit_plan(self, builder, depth, indent):
+        v = builder.bind(self)
+        args = builder.emit_fetch(self.names, depth, indent)
+        builder.emit(indent, "if {}:", builder.all_present(args))
+        builder.emit(indent + 1, "r = {}(scope, {})", builder.bind(self.method), ", ".join(args))
+        builder.emit_result(v, indent + 1)
+        builder.emit_missing(v, "{}.strict".format(v), "{}.method".format(v), indent, log=True)
 
-class Dispatch(object):
-    def __init__(self, names, method, strict=False):
+
+class Batched(object):
+    """a validator called once with the values of all elements, e.g. in a collection or in a batch of validate_many()
+
+    the method receives a list of values for each name, and returns {position: NG} (or a sequence of OK/NG)
+    """
+
+    def __init__(self, names, method, msg=None, path=None, strict=False):
         self.names = names
-        self.dispatch_method = method
+        self.method = method
         self._v_count = counter()
+        self.msg = msg
+        self.path = path
         self.strict = strict
 
-    def dispatch_validate(self, rail, child, path=[], context=None):
-        if not isinstance(path, (list, tuple)):
-            path = [path]
-        N = len(path)
+    def validate_context(self, context):
+        if context.batching and not context.path:
+            return
+        for _, ng in self.check_batch(context.scope, [context.params]):
+            context.scope.dispatch(context, self, ng)
+            if context.status.budget == 0:
+                break
+
+    def check_batch(self, scope, children):
+        indices = []
+        columns = [[] for _ in self.names]
+        for i, params in enumerate(children):
+            if present(params, self.names):
+                indices.append(i)
+                for column, name in zip(columns, self.names):
+                    column.append(params.get(name))
+            elif self.strict:
+                yield i, scope.on_missing(self.names, self.__class__.__name__, self.method)
+        if not indices:
+            return
+        for position, ng in self.call(scope, columns):
+            yield indices[position], ng
+
+    def call(self, scope, columns):
+        result = self.method(scope, *columns)
+        if result is None:
+            return
+        for position, ng in (result.items() if hasattr(result, "items") else enumerate(result)):
+            if ng is not None:
+                yield position, ng
+
+
+class Vectorized(Batched):
+    """a batched validator receiving numpy arrays, and returning a boolean mask (or indices) of failures
+
+    if numpy is not installed, the method is called for each element with scalar values.
+    """
+
+    def call(self, scope, columns):
+        ng = NG(self.msg)
+        if numpy is None:
+            for position, values in enumerate(zip(*columns)):
+                if self.method(scope, *values):
+                    yield position, ng
+            return
+
+        failures = numpy.asarray(self.method(scope, *(numpy.asarray(column) for column in columns)))
+        if failures.dtype == bool:
+            failures = numpy.flatnonzero(failures)
+        for position in failures.tolist():
+            yield position, ng
+
+
+class Traversal(object):
+    """an explicit stack of nested levels, pushed by Dispatch and (recursive) Subrail
+
+    the levels are validated in a loop, so deeply nested data doesn't consume the python stack.
+    only the last validator of a level is pushed (nothing of the level is validated after it),
+    the others are validated at once, in the order of validators.
+    """
+
+    def __init__(self, context):
+        self.context = context
+        self.stack = []  # (validator, params, path) or the number of path elements to be popped
+        self.tail = None  # the last validator of the current level
+        self.params = None  # the params of the current level
+
+    def deferrable(self, v, params):
+        return self.tail is v and self.params is params
 
+    def __call__(self, rail, child, path=()):
+        # check() of Dispatch
+        if not isinstance(path, (list, tuple)):
+            path = (path, )
+        self.stack.append((rail, child, path))
+
+    def reverse(self, mark):
+        # the levels pushed first are validated first (in place)
+        stack = self.stack
+        i, j = mark, len(stack) - 1
+        while i < j:
+            stack[i], stack[j] = stack[j], stack[i]
+            i += 1
+            j -= 1
+
+    def run(self):
+        context = self.context
+        stack = self.stack
+        path = context.path
+        base = len(path)
         original = context.params
-        context.params = child
-        context.path.extend(path)
-        rail.validate_context(context)
-        for i in range(N):
-            context.path.pop()
+        status = context.status
+        while stack:
+            frame = stack.pop()
+            if frame.__class__ is int:
+                del path[len(path) - frame:]
+                continue
+            if status.budget == 0:
+                del stack[:]
+                break
+            target, params, subpath = frame
+            path.extend(subpath)
+            stack.append(len(subpath))
+            context.params = params
+            validators = target.validators
+            self.tail = validators[-1] if validators else None
+            self.params = params
+            target.validate_context(context)
+        self.tail = self.params = None
+        del path[base:]
         context.params = original
 
+
+def traverse(context, push, params):
+    previous = context.traversal
+    if previous is None:
+        traversal = context.spare  # a traversal is reused by the context (the stack is empty after run())
+        if traversal is None:
+            traversal = context.spare = Traversal(context)
+    else:  # validated at once, in the middle of a level
+        traversal = Traversal(context)
+    context.traversal = traversal
+    try:
+        push(context, traversal, params)
+        traversal.run()
+    finally:
+        del traversal.stack[:]
+        context.traversal = previous
+
+
+class Dispatch(object):
+    def __init__(self, names, method, strict=False):
+        self.names = names
+        self.dispatch_method = method
+        self._v_count = counter()
+        self.strict = strict
+
     def validate_context(self, context):
         params = context.params
-        if not self.names:
-            check_fn = partial(self.dispatch_validate, context=context)
-            return self.dispatch_method(context.scope, check_fn, params)
-        if all(params.get(name) is not None for name in self.names):
-            check_fn = partial(self.dispatch_validate, context=context)
-            self.dispatch_method(context.scope, partial(self.dispatch_validate, context=context), params)
+        if self.names and not present(params, self.names):
+            return
+        traversal = context.traversal
+        if traversal is not None and traversal.deferrable(self, params):
+            self.push(context, traversal, params)
+        else:
+            traverse(context, self.push, params)
+
+    def push(self, context, traversal, params):
+        mark = len(traversal.stack)
+        self.dispatch_method(context.scope, traversal, params)
+        traversal.reverse(mark)
 
 
 class Matched(object):
-    def __init__(self, names, method, path=None, msg=None, strict=False):
+    def __init__(self, names, method, path=None, msg=None, strict=False, cache=None):
         self.names = names
-        self.method = method
+        self.method = memoize(method, cache, key=lambda args: typed_key(args[0]))
         self.path = path
         self._v_count = counter()
         self.msg = msg
@@ -119,8 +689,13 @@ class Matched(object):
 
     def validate_context(self, context):
         params = context.params
-        if any(params.get(name) is not None for name in self.names):
-            result = self.method(context.scope, [params[name] for name in self.names if params.get(name) is not None])
+        values = []
+        for name in self.names:
+            value = params.get(name)
+            if value is not None:
+                values.append(value)
+        if values:
+            result = self.method(context.scope, values)
             context.scope.dispatch(context, self, result)
         else:
             if self.strict:
@@ -128,15 +703,39 @@ class Matched(object):
                 context.scope.dispatch(context, self, ng)
             logger.debug("names=%s not found", self.names)
 
+    def emit_plan(self, builder, depth, indent):
+        v = builder.bind(self)
+        args = builder.emit_fetch(self.names, depth, indent)
+        builder.emit(indent, "if {}:", builder.any_present(args))
+        if len(args) > 1:
+            builder.emit(indent + 1, "if {}:", builder.all_present(args))
+            builder.emit(indent + 2, "vs = [{}]", ", ".join(args))
+            builder.emit(indent + 1, "else:")
+            builder.emit(indent + 2, "vs = []")
+            for a in args:
+                builder.emit(indent + 2, "if {} is not None: vs.append({})", a, a)
+        else:
+            builder.emit(indent + 1, "vs = [{}]", args[0])
+        builder.emit(indent + 1, "r = {}(scope, vs)", builder.bind(self.method))
+        builder.emit_result(v, indent + 1)
+        builder.emit_missing(v, "{}.strict".format(v), "{}.method".format(v), indent, log=True)
+
 
 class container(object):
     def __init__(self, cls):
         self.cls = cls
         self.names = [cls.__name__]  # for common interface
-        self.validators = [v for v in cls.__dict__.values() if is_validator(v)]
-        self.validators.sort(key=lambda o: o._v_count)
+        self._validators = None
+        self.subtrees = subtree_cache(getattr(cls, "subtree_cache", None))
         self._v_count = counter()
 
+    @property
+    def validators(self):
+        # collected at the first use
+        if self._validators is None:
+            self._validators = scheduled_validators(self.cls, class_validators(self.cls))
+        return self._validators
+
     def validate_context(self, context):
         if self.names[0] not in context.params:
             if getattr(self.cls, "strict", False):
@@ -148,20 +747,45 @@ class container(object):
         context.path.append(self.names[0])
         original = context.params
         context.params = context.params[self.names[0]]
-        for v in self.validators:
-            v.validate_context(context)
+        if self.subtrees is not None:
+            self.subtrees.validate(context, self.validators)
+        else:
+            validate_all(context, self.validators)
         context.params = original
         context.path.pop()
 
+    def emit_plan(self, builder, depth, indent):
+        if self.subtrees is not None or is_schedule(self.validators):
+            return builder.emit_fallback(self, indent)
+        v = builder.bind(self)
+        builder.emit_nested(v, self.names[0], self.validators, depth, indent, self.cls)
+        builder.emit_missing(v, "getattr({}.cls, 'strict', False)".format(v), "{}.cls".format(v), indent, log=True)
+
 
 class collection(object):
     def __init__(self, cls):
         self.cls = cls
         self.names = [cls.__name__]  # for common interface
-        self.validators = [v for v in cls.__dict__.values() if is_validator(v)]
-        self.validators.sort(key=lambda o: o._v_count)
+        self._validators = self._batched = None
+        self.threads = getattr(cls, "threads", None)  # if given, elements are validated on a thread pool
+        self.subtrees = subtree_cache(getattr(cls, "subtree_cache", None))
         self._v_count = counter()
 
+    @property
+    def validators(self):
+        # collected at the first use
+        if self._validators is None:
+            validators = class_validators(self.cls)
+            self._batched = [v for v in validators if isinstance(v, Batched)]
+            self._validators = scheduled_validators(self.cls, [v for v in validators if not isinstance(v, Batched)])
+        return self._validators
+
+    @property
+    def batched(self):
+        if self._validators is None:
+            self.validators
+        return self._batched
+
     def validate_context(self, context):
         if self.names[0] not in context.params:
             if getattr(self.cls, "strict", False):
@@ -172,20 +796,109 @@ class collection(object):
 
         context.path.append(self.names[0])
         original = context.params
-        for i, child in enumerate(context.params[self.names[0]]):
-            context.path.append(i)
-            context.params = child
-            for v in self.validators:
-                v.validate_context(context)
-            context.path.pop()
+        children = self.children(context.params[self.names[0]])
+        if self.threads:
+            self.validate_threaded(context, children)
+        else:
+            for i, child in enumerate(children):
+                context.path.append(i)
+                context.params = child
+                if self.subtrees is not None:
+                    self.subtrees.validate(context, self.validators)
+                else:
+                    validate_all(context, self.validators)
+                context.path.pop()
+                if context.status.budget == 0:
+                    break
         context.params = original
+        if self.batched and context.status.budget != 0:
+            self.validate_batched(context, children)
         context.path.pop()
 
+    def children(self, children):
+        if self.batched and not isinstance(children, (list, tuple)):
+            return list(children)
+        return children
+
+    def validate_threaded(self, context, children):
+        from .threads import run_threaded
+        path = context.path
+        run_threaded(context, self.threads, [(self.validators, child, path + [i]) for i, child in enumerate(children)])
+
+    def validate_batched(self, context, children):
+        original = context.params
+        for v in self.batched:
+            for i, ng in v.check_batch(context.scope, children):
+                context.path.append(i)
+                context.params = children[i]
+                context.scope.dispatch(context, v, ng)
+                context.path.pop()
+                if context.status.budget == 0:
+                    context.params = original
+                    return
+        context.params = original
+
+    def emit_plan(self, builder, depth, indent):
+        if self.threads or self.subtrees is not None or is_schedule(self.validators):
+            return builder.emit_fallback(self, indent)
+        v = builder.bind(self)
+        key = builder.literal(self.names[0])
+        p, q, i = "p{}".format(depth), "p{}".format(depth + 1), "i{}".format(depth + 1)
+        builder.emit(indent, "if {} in {}:", key, p)
+        builder.emit(indent + 1, "path.append({})", key)
+        builder.pushed += 1
+        if self.batched:
+            builder.emit(indent + 1, "c{} = {}.children({}[{}])", depth, v, p, key)
+            builder.emit(indent + 1, "for {}, {} in enumerate(c{}):", i, q, depth)
+        else:
+            builder.emit(indent + 1, "for {}, {} in enumerate({}[{}]):", i, q, p, key)
+        builder.emit(indent + 2, "path.append({})", i)
+        builder.emit(indent + 2, "context.params = {}", q)
+        builder.pushed += 1
+        builder.enter(self.cls, self.names[0])
+        builder.emit_body(self.validators, depth + 1, indent + 2)
+        builder.leave()
+        builder.pushed -= 1
+        builder.emit(indent + 2, "path.pop()")
+        builder.emit(indent + 1, "context.params = {}", p)
+        if self.batched:
+            builder.emit(indent + 1, "{}.validate_batched(context, c{})", v, depth)
+            builder.emit_stop(indent + 1)
+        builder.pushed -= 1
+        builder.emit(indent + 1, "path.pop()")
+        builder.emit_missing(v, "getattr({}.cls, 'strict', False)".format(v), "{}.cls".format(v), indent, log=True)
+
+
+class Inlined(object):
+    """the validators of a Gardrail, validated in the current scope (as a subrail)"""
+
+    def __init__(self, target):
+        self.target = target
+
+    @property
+    def validators(self):
+        return self.target.validators
+
+    def validate_context(self, context):
+        target = self.target
+        if context.collector is None:
+            plan = target._plan
+            if plan is None:
+                plan = compile_plan(target if isinstance(target, type) else target.__class__)
+        else:
+            plan = target._instrumented_plan
+            if plan is None:
+                plan = compile_plan(target if isinstance(target, type) else target.__class__, instrumented=True)
+        plan(context.scope, context)
+
 
 class Subrail(object):
     def __init__(self, name, target, strict=False):
         self.names = [name]
         self.Gardrail = target
+        self.inlined = Inlined(target)
+        self.subtrees = subtree_cache(getattr(target, "subtree_cache", None),
+                                      owner=target if isinstance(target, type) else target.__class__)
         self._v_count = counter()
         self.strict = strict
 
@@ -197,15 +910,92 @@ class Subrail(object):
             logger.debug("names=%s not found", self.names)
             return
 
-        context.path.append(self.names[0])
-        original = context.params
-        context.params = context.params[self.names[0]]
+        if self.subtrees is not None:
+            context.path.append(self.names[0])
+            original = context.params
+            context.params = original[self.names[0]]
+            self.subtrees.validate(context, self.Gardrail.validators)
+            context.params = original
+            context.path.pop()
+            return
 
-        for v in self.Gardrail.validators:
-            v.validate_context(context)
+        # a recursive subrail is validated as a level of the traversal
+        traversal = context.traversal
+        if traversal is not None and traversal.deferrable(self, context.params):
+            self.push(context, traversal, context.params)
+        else:
+            traverse(context, self.push, context.params)
 
-        context.params = original
-        context.path.pop()
+    def push(self, context, traversal, params):
+        traversal.stack.append((self.inlined, params[self.names[0]], self.names))
+
+    def emit_plan(self, builder, depth, indent):
+        target = self.Gardrail
+        if target in builder.inlining or self.subtrees is not None or is_schedule(target.validators):
+            # recursive definition, cached or scheduled
+            return builder.emit_fallback(self, indent)
+        builder.depends.add(target if isinstance(target, type) else target.__class__)
+        builder.inlining.append(target)
+        v = builder.bind(self)
+        builder.emit_nested(v, self.names[0], target.validators, depth, indent, target)
+        builder.emit_missing(v, "{}.strict".format(v), "{}.Gardrail".format(v), indent, log=True)
+        builder.inlining.pop()
+
+
+class DispatchOn(object):
+    """validating params with the Gardrail selected by a discriminator field, with one dict lookup
+
+    the Gardrails in the table are validated in the current scope, as subrails without nesting.
+    unknown (or unhashable) discriminators are reported by on_unknown().
+    """
+
+    def __init__(self, names, table, method=None, strict=False):
+        self.names = names
+        self.table = table
+        self.branches = dict((k, Inlined(target)) for k, target in table.items())
+        self.method = method  # if given, method(self, value) returns the key of the table
+        self._v_count = counter()
+        self.strict = strict
+
+    def __call__(self, method):
+        return self.__class__(self.names, self.table, method=method, strict=self.strict)
+
+    def validate_context(self, context):
+        value = context.params.get(self.names[0])
+        if value is None:
+            if self.strict:
+                ng = context.scope.on_missing(self.names, self.__class__.__name__, self.names[0])
+                context.scope.dispatch(context, self, ng)
+            logger.debug("names=%s not found", self.names)
+            return
+        key = value if self.method is None else self.method(context.scope, value)
+        try:
+            branch = self.branches.get(key)
+        except TypeError:  # unhashable
+            branch = None
+        if branch is None:
+            context.scope.dispatch(context, self, context.scope.on_unknown(self.names, self.__class__.__name__, value))
+        else:
+            branch.validate_context(context)
+
+    def emit_plan(self, builder, depth, indent):
+        v = builder.bind(self)
+        arg, = builder.emit_fetch(self.names, depth, indent)
+        builder.emit(indent, "if {} is not None:", arg)
+        key = arg if self.method is None else "{}(scope, {})".format(builder.bind(self.method), arg)
+        builder.emit(indent + 1, "k = {}", key)
+        builder.emit(indent + 1, "try:")
+        builder.emit(indent + 2, "b = {}.get(k)", builder.bind(self.branches))
+        builder.emit(indent + 1, "except TypeError:")
+        builder.emit(indent + 2, "b = None")
+        builder.emit(indent + 1, "if b is None:")
+        builder.emit(indent + 2, "scope.dispatch(context, {0}, scope.on_unknown({0}.names, {1!r}, {2}))",
+                     v, self.__class__.__name__, arg)
+        builder.emit(indent + 1, "else:")
+        builder.emit(indent + 2, "b.validate_context(context)")
+        builder.emit_stop(indent + 1)
+        builder.emit_missing(v, "{}.strict".format(v), "{}.names[0]".format(v), indent, log=True)
+        builder.forget(depth)  # params may be converted by the branch
 
 
 class Convert(object):
@@ -219,32 +1009,58 @@ class Convert(object):
 
     def validate_context(self, context):
         params = context.params
+        if not self.names or present(params, self.names):
+            result = self.method(context.scope, params)
+            if result is not None and iscoroutine(result):
+                reject_coroutine(self, result)
+            return result
+        elif self.strict:
+            ng = context.scope.on_missing(self.names, self.__class__.__name__, self.method)
+            context.scope.dispatch(context, self, ng)
+
+    def emit_plan(self, builder, depth, indent):
+        v = builder.bind(self)
+        call = "{}(scope, p{})".format(builder.bind(self.method), depth)
         if not self.names:
-            return self.method(context.scope, params)
+            builder.emit(indent, call)
         else:
-            if all(params.get(name) is not None for name in self.names):
-                return self.method(context.scope, params)
-            elif self.strict:
-                ng = context.scope.on_missing(self.names, self.__class__.__name__, self.method)
-                context.scope.dispatch(context, self, ng)
+            args = builder.emit_fetch(self.names, depth, indent)
+            builder.emit(indent, "if {}:", builder.all_present(args))
+            builder.emit(indent + 1, call)
+            builder.emit_missing(v, "{}.strict".format(v), "{}.method".format(v), indent, log=False)
+        builder.forget(depth)  # params are changed
+
+
+def single(name, msg=None, strict=False, batched=False, pure=False, cache=None):
+    if batched:
+        return partial(Batched, [name], msg=msg, strict=strict)
+    return partial(Multi, [name], msg=msg, strict=strict, cache=cache_size(pure, cache))
 
 
-def single(name, msg=None, strict=False):
-    return partial(Multi, [name], msg=msg, strict=strict)
+def multi(names, path=None, msg=None, strict=False, batched=False, pure=False, cache=None):
+    assert isinstance(names, (list, tuple))
+    if batched:
+        return partial(Batched, names, msg=msg, path=path, strict=strict)
+    return partial(Multi, names, msg=msg, path=path, strict=strict, cache=cache_size(pure, cache))
 
 
-def multi(names, path=None, msg=None, strict=False):
+def vectorized(names, msg, path=None, strict=False):
     assert isinstance(names, (list, tuple))
-    return partial(Multi, names, msg=msg, path=path, strict=strict)
+    return partial(Vectorized, names, msg=msg, path=path, strict=strict)
 
 
 def dispatch(names=None, strict=False):
     return partial(Dispatch, names, strict=strict)
 
 
-def matched(names, path, msg=None, strict=False):
+def dispatch_on(name, table, strict=False):
+    """table is {value: Gardrail class or instance}. as a decorator, the method converts the value to the key"""
+    return DispatchOn([name], table, strict=strict)
+
+
+def matched(names, path, msg=None, strict=False, pure=False, cache=None):
     assert isinstance(names, (list, tuple))
-    return partial(Matched, names, path=path, msg=msg, strict=strict)
+    return partial(Matched, names, path=path, msg=msg, strict=strict, cache=cache_size(pure, cache))
 
 
 def subrail(name, strict=False):
@@ -255,10 +1071,13 @@ def convert(names=None, msg=None, strict=False, path=None):
     return partial(Convert, names, path=path, msg=msg, strict=strict)
 
 
-def share(*factories):
+def share(*factories, **options):
+    """options: pure=True or cache=N, the memo is shared by all validators"""
     cls_env = sys._getframe(1).f_locals
+    cache = cache_size(options.get("pure", False), options.get("cache"))
 
     def wrapper(method):
+        method = memoize(method, cache)
         validations = []
         for f in factories:
             name = "{}{}".format(method.__name__, counter())
@@ -270,8 +1089,9 @@ def share(*factories):
 
 
 class _Status(object):
-    def __init__(self, status):
+    def __init__(self, status, budget=None):
         self.status = status
+        self.budget = budget  # the number of errors to be found before stopping (None is unlimited)
 
     def __call__(self, status):
         self.status = status
@@ -281,76 +1101,495 @@ class _Status(object):
     __nonzero__ = __bool__
 
 
-class GardrailMeta(type):
-    def __new__(self, name, bases, attrs):
-        ancestor_validators = set(v for c in bases for v in getattr(c, "validators", []) if is_validator(v))
-        validators = set([v for v in attrs.values() if is_validator(v)])
-        validators = list(ancestor_validators | validators)
-        validators.sort(key=lambda o: o._v_count)
-        attrs["validators"] = validators
-
-        def __call__(self, ob):
-            status = _Status(True)
-            params, errors = self.configure(ob)
-            if errors:
-                return self.on_failure(ob, params, errors)
-
-            context = Context(ob=ob, scope=self, status=status, params=params, errors=errors, path=[])
-            self.validate_context(context)
-
-            if status:
-                return self.on_success(ob, params)
+class PlanBuilder(object):
+    """generating the source of a plan, a flat function specialized for a list of validators"""
+
+    def __init__(self, instrumented=False):
+        self.instrumented = instrumented
+        self.owners = []  # the names of the classes defining the validators, at the current line
+        self.levels = []  # the names of nested levels, at the current line
+        self.lines = []
+        self.env = {}
+        self.inlining = []
+        self.depends = set()
+        self.pushed = 0  # the number of path elements pushed by the plan, at the current line
+        self.logs = False  # if True, the plan logs missing fields (only when debug logging is enabled)
+        self.fields = {}  # depth -> {name: local variable}
+
+    def bind(self, ob):
+        name = "_{}".format(len(self.env))
+        self.env[name] = ob
+        return name
+
+    def literal(self, value):
+        if type(value) in literal_types:
+            return repr(value)
+        return self.bind(value)
+
+    def emit(self, indent, fmt, *args):
+        self.lines.append("    " * indent + fmt.format(*args))
+
+    def emit_fetch(self, names, depth, indent):
+        # each field is looked up once per level, until a validator may change the params
+        fields = self.fields[depth]
+        args = []
+        for name in names:
+            if name not in fields:
+                fields[name] = "f{}_{}".format(depth, len(fields))
+                self.emit(indent, "{} = p{}.get({})", fields[name], depth, self.literal(name))
+            args.append(fields[name])
+        return args
+
+    def forget(self, depth):
+        self.fields[depth] = {}
+
+    def all_present(self, args):
+        return " and ".join("{} is not None".format(a) for a in args) or "True"
+
+    def any_present(self, args):
+        return " or ".join("{} is not None".format(a) for a in args) or "False"
+
+    def emit_result(self, v, indent):
+        self.emit(indent, "if r is not None:")
+        self.emit(indent + 1, "scope.dispatch(context, {}, r)", v)
+        self.emit_stop(indent + 1)
+
+    def emit_stop(self, indent):
+        # the error budget is spent (max_errors, fail_fast or Interrupt)
+        self.emit(indent, "if context.status.budget == 0:")
+        if self.pushed:
+            self.emit(indent + 1, "del path[-{}:]", self.pushed)
+            self.emit(indent + 1, "context.params = p0")
+        self.emit(indent + 1, "return")
+
+    def emit_missing(self, v, strict, fn, indent, log=True):
+        self.emit(indent, "elif {}:", strict)
+        self.emit(indent + 1, "scope.dispatch(context, {0}, scope.on_missing({0}.names, {1!r}, {2}))",
+                  v, self.env[v].__class__.__name__, fn)
+        self.emit_stop(indent + 1)
+        if log:
+            self.logs = True
+            self.emit(indent, "elif debug:")
+            self.emit(indent + 1, "logger.debug('names=%s not found', {}.names)", v)
+
+    def enter(self, owner, name):
+        self.owners.append(owner.__name__ if isinstance(owner, type) else owner.__class__.__name__)
+        self.levels.append(name)
+
+    def leave(self):
+        self.owners.pop()
+        self.levels.pop()
+
+    def emit_nested(self, v, name, validators, depth, indent, owner):
+        key = self.literal(name)
+        p, q = "p{}".format(depth), "p{}".format(depth + 1)
+        self.emit(indent, "if {} in {}:", key, p)
+        self.emit(indent + 1, "path.append({})", key)
+        self.emit(indent + 1, "{} = context.params = {}[{}]", q, p, key)
+        self.pushed += 1
+        self.enter(owner, name)
+        self.emit_body(validators, depth + 1, indent + 1)
+        self.leave()
+        self.pushed -= 1
+        self.emit(indent + 1, "context.params = {}", p)
+        self.emit(indent + 1, "path.pop()")
+
+    def emit_fallback(self, v, indent):
+        self.emit(indent, "{}.validate_context(context)", self.bind(v))
+        self.emit_stop(indent)
+
+    def emit_body(self, validators, depth, indent):
+        self.fields[depth] = {}
+        if not validators:
+            self.emit(indent, "pass")
+        for v in validators:
+            if self.instrumented:
+                self.emit_instrumented(v, depth, indent)
             else:
-                return self.on_failure(ob, params, errors)
+                self.emit_validator(v, depth, indent)
+
+    def emit_validator(self, v, depth, indent):
+        emit_plan = getattr(v, "emit_plan", None)
+        if iscoroutinefunction(getattr(v, "method", None)):
+            self.emit(indent, "raise TypeError({!r})", "{} is async, use avalidate()".format(v.method.__name__))
+        elif emit_plan is None:
+            self.emit_fallback(v, indent)
+            self.forget(depth)
+        else:
+            emit_plan(self, depth, indent)
+
+    def emit_instrumented(self, v, depth, indent):
+        from .instrument import Key, validator_name
+        key = self.bind(Key(self.owners[-1], validator_name(v), tuple(self.levels)))
+        t, n = "t{}".format(indent), "n{}".format(indent)
+        self.emit(indent, "{} = clock()", t)
+        self.emit(indent, "{} = context.errors.count", n)
+        self.emit(indent, "try:")
+        self.emit_validator(v, depth, indent + 1)
+        self.emit(indent, "finally:")
+        self.emit(indent + 1, "record({}, clock() - {}, context.errors.count - {})", key, t, n)
+
+    def build(self, name):
+        filename = "<gardrail plan {}:{}>".format(name, id(self))
+        head = ["def plan(scope, context, {}):".format(", ".join("{0}={0}".format(k) for k in sorted(self.env))),
+                "    path = context.path",
+                "    p0 = context.params"]
+        if self.instrumented:
+            head.append("    record = context.collector.record")
+        if self.logs:
+            head.append("    debug = logger.isEnabledFor(DEBUG)")
+        source = "\n".join(head + self.lines) + "\n"
+        linecache.cache[filename] = (len(source), None, source.splitlines(True), filename)
+        namespace = {"logger": logger, "DEBUG": logging.DEBUG, "clock": perf_counter}
+        namespace.update(self.env)
+        exec(compile(source, filename, "exec"), namespace)
+        plan = namespace["plan"]
+        plan.source = source
+        return plan
+
+
+# plans are shared by the classes having the same validators
+_shared_plans = weakref.WeakValueDictionary()
+# compiling and invalidating plans (and collecting validators) are serialized, validation doesn't take it
+_plans_lock = threading.RLock()
+
+
+def compile_plan(cls, instrumented=False):
+    """returns the plan of a Gardrail class (compiled at the first time, and cached)
+
+    an instrumented plan records the time of each validator into context.collector
+    """
+    attr = "_instrumented_plan" if instrumented else "_plan"
+    plan = getattr(cls, attr)
+    if plan is not None:
+        return plan
+    with _plans_lock:
+        return _compile_plan(cls, attr, instrumented)
+
+
+def _compile_plan(cls, attr, instrumented):
+    plan = getattr(cls, attr)  # compiled by another thread
+    if plan is None and is_schedule(cls.validators):
+        from .schedule import scheduled_plan
+        plan = scheduled_plan(cls, instrumented=instrumented)
+        type.__setattr__(cls, attr, staticmethod(plan))
+    if plan is None and cls.threads and not instrumented:
+        from .threads import threaded_plan
+        plan = threaded_plan(cls)
+        type.__setattr__(cls, attr, staticmethod(plan))
+    if plan is None:
+        key = None if instrumented else tuple(cls.validators)
+        plan = _shared_plans.get(key) if key is not None else None
+        if plan is None:
+            builder = PlanBuilder(instrumented=instrumented)
+            builder.inlining.append(cls)
+            builder.owners.append(cls.__name__)
+            builder.emit_body(cls.validators, 0, 1)
+            plan = builder.build(cls.__name__)
+            plan.key = key
+            plan.depends = [target for target in builder.depends if isinstance(target, GardrailMeta)]
+            if key is not None:
+                _shared_plans[key] = plan
+        for target in plan.depends:
+            dependents(target).add(cls)
+        type.__setattr__(cls, attr, staticmethod(plan))
+    return plan
+
+
+def dependents(cls):
+    """the classes whose plans inline the validators of cls"""
+    classes = cls.__dict__.get("_dependents")
+    if classes is None:
+        classes = weakref.WeakSet()
+        type.__setattr__(cls, "_dependents", classes)
+    return classes
+
+
+def collect_validators(cls):
+    ancestor_validators = set(v for c in cls.__bases__ for v in getattr(c, "validators", []) if is_validator(v))
+    validators = set([v for v in cls.__dict__.values() if is_validator(v)])
+    validators = list(ancestor_validators | validators)
+    validators.sort(key=attrgetter("_v_count"))
+    return scheduled_validators(cls, validators)
+
+
+class Validators(object):
+    """the validators of a Gardrail class, collected at the first access"""
+
+    def __get__(self, ob, cls):
+        validators = cls.__dict__.get("_validators")
+        if validators is None:
+            with _plans_lock:
+                validators = cls.__dict__.get("_validators")
+                if validators is None:
+                    validators = collect_validators(cls)
+                    type.__setattr__(cls, "_validators", validators)
+        return validators
+
+
+def invalidate_plan(cls, recollect=False, seen=None):
+    with _plans_lock:
+        _invalidate_plan(cls, recollect=recollect, seen=seen)
+
+
+def _invalidate_plan(cls, recollect=False, seen=None):
+    if seen is None:
+        seen = set()
+    if cls in seen:
+        return
+    seen.add(cls)
+    if recollect:
+        type.__setattr__(cls, "_validators", None)
+    for attr in ("_plan", "_instrumented_plan"):
+        plan = getattr(cls, attr)
+        if plan is not None:
+            key = getattr(plan, "key", None)
+            if key is not None and _shared_plans.get(key) is plan:
+                del _shared_plans[key]
+            type.__setattr__(cls, attr, None)
+    for sub in cls.__subclasses__():
+        _invalidate_plan(sub, recollect=recollect, seen=seen)
+    for dependent in list(cls.__dict__.get("_dependents", ())):
+        _invalidate_plan(dependent, seen=seen)
+
 
-        attrs["__call__"] = __call__
-        attrs["validate"] = __call__
+class GardrailMeta(type):
+    def __new__(self, name, bases, attrs):
+        # validators and plans are built at the first use
+        attrs["_plan"] = None
+        attrs["_instrumented_plan"] = None
         return super(GardrailMeta, self).__new__(self, name, bases, attrs)
 
+    # the plan is rebuilt when the class is changed
+    def __setattr__(cls, name, value):
+        super(GardrailMeta, cls).__setattr__(name, value)
+        invalidate_plan(cls, recollect=is_validator(value) or name == "scheduled")
+
+    def __delattr__(cls, name):
+        super(GardrailMeta, cls).__delattr__(name)
+        invalidate_plan(cls, recollect=True)
+
 
 class _Gardrail(object):
+    concurrency = None  # the limit of concurrently awaited validators in avalidate()
+    max_errors = None  # validation is stopped when max_errors errors are found
+    fail_fast = False  # same as max_errors = 1
+    collector = None  # if not None, the statistics of each validator are recorded (see instrument())
+    threads = None  # if given, validators are run on a thread pool of this size (see gardrail.threads)
+    copy_on_write = False  # if True, the input is not changed by convert (see gardrail.overlay)
+    subtree_cache = None  # as a subrail, True or N caches the results of same subtrees (see gardrail.subtree)
+    compact_errors = None  # True, N (the cap of ranges) or kwargs of CompactErrors, errors are grouped by path
+    scheduled = False  # if True, validators are ordered by their dependencies and skipped after errors
+    validators = Validators()
+
+    def __call__(self, ob, max_errors=None, fail_fast=None, only=None):
+        if only is not None:
+            return self.revalidate(ob, only, max_errors=max_errors, fail_fast=fail_fast)
+        params, errors = self.configure(ob)
+        if errors:
+            return self.on_failure(ob, params, errors)
+
+        params = self.overlay(params)
+        context = acquire_context(self, ob, params, self.error_budget(max_errors, fail_fast))
+        self.validate_context(context)
+
+        if context.status:
+            release_context(context)
+            return self.on_success(ob, materialize(params))
+        else:
+            return self.on_failure(ob, materialize(params), context.errors)
+    validate = __call__
+
     def validate_context(self, context):
-        for v in self.validators:
-            v.validate_context(context)
+        if context.collector is None:
+            plan = self._plan
+            if plan is None:
+                plan = compile_plan(self.__class__)
+        else:
+            plan = self._instrumented_plan
+            if plan is None:
+                plan = compile_plan(self.__class__, instrumented=True)
+        plan(context.scope, context)  # validators are called with the outermost scope, as dispatch() does
+
+    @contextlib.contextmanager
+    def instrument(self, collector=None):
+        """recording call counts, timings and failures of each validator into collector, in the with block"""
+        if collector is None:
+            from .instrument import Collector
+            collector = Collector()
+        previous = self.collector
+        self.collector = collector
+        try:
+            yield collector
+        finally:
+            self.collector = previous
+
+    def make_errors(self):
+        option = self.compact_errors
+        if not option:
+            return Errors()
+        elif option is True:
+            return CompactErrors()
+        elif isinstance(option, dict):
+            return CompactErrors(**option)
+        return CompactErrors(cap=option)
+
+    def overlay(self, params):
+        """with copy_on_write, params are wrapped by Overlay, and changes are copied at the end"""
+        if self.copy_on_write and isinstance(params, dict):
+            return Overlay(params)
+        return params
+
+    def error_budget(self, max_errors=None, fail_fast=None):
+        if fail_fast is None:
+            fail_fast = self.fail_fast
+        if fail_fast:
+            return 1
+        budget = self.max_errors if max_errors is None else max_errors
+        if budget is not None and budget < 1:
+            raise ValueError("max_errors must be 1 or more (None is unlimited): {!r}".format(budget))
+        return budget
+
+    def iter_errors(self, ob, max_errors=None, fail_fast=None):
+        """yielding (path, message) of each error, validation is stopped when the error budget is spent
+
+        the errors are yielded after validation (it is not lazy), max_errors/fail_fast stop validation early.
+        """
+        params, errors = self.configure(ob)
+        if errors:
+            for error in flatten_errors(errors):
+                yield error
+            return
+
+        errors = Errors()
+        status = _Status(True, self.error_budget(max_errors, fail_fast))
+        params = self.overlay(params)
+        self.validate_context(Context(ob=ob, scope=self, status=status, params=params, errors=errors, path=[],
+                                      collector=self.collector))
+        for error in errors.flat():
+            yield error
+
+    def revalidate(self, ob, changed, previous_errors=None, max_errors=None, fail_fast=None):
+        """validating again only with the validators related to changed fields, and splicing into previous_errors
+
+        the error budget (max_errors, fail_fast) is for the validators run again.
+        """
+        from .incremental import revalidate
+        return revalidate(self, ob, changed, previous_errors=previous_errors, max_errors=max_errors,
+                          fail_fast=fail_fast)
+
+    def validate_many(self, iterable, batch_size=1000, workers=None, chunksize=None, max_errors=None, fail_fast=None):
+        """validating each record lazily, yielding Result(index, ok, params, errors) without raising Failure
+
+        if workers is given, records are validated on a process pool, chunksize records at a time.
+        """
+        budget = self.error_budget(max_errors, fail_fast)
+        if workers is not None:
+            from .parallel import validate_parallel
+            return validate_parallel(self, iterable, workers, chunksize or batch_size, budget)
+        return self._validate_many(iterable, batch_size, budget)
+
+    def _validate_many(self, iterable, batch_size, budget):
+        batched = [v for v in self.validators if isinstance(v, Batched)]
+        status = _Status(True)
+        errors = self.make_errors()
+        context = Context(ob=None, scope=self, status=status, params=None, errors=errors, path=[],
+                          batching=bool(batched), collector=self.collector)
+        iterator = iter(iterable)
+        index = 0
+        while True:
+            obs = list(islice(iterator, batch_size))
+            if not obs:
+                return
+            rows = []  # [ok, params, errors, budget]
+            for ob, (params, configured_errors) in zip(obs, self.configure_many(obs)):
+                if configured_errors:
+                    rows.append([None, params, configured_errors, 0])
+                    continue
+
+                status(True)
+                status.budget = budget
+                context.ob = ob
+                context.subtrees = None
+                context.params = params = self.overlay(params)
+                self.validate_context(context)
+                params = materialize(params)
+
+                if status:
+                    rows.append([True, params, None, status.budget])
+                else:
+                    rows.append([False, params, errors, status.budget])
+                    errors = context.errors = self.make_errors()
+
+            if batched:
+                self.validate_batched_records(context, batched, obs, rows)
+            for ob, (ok, params, row_errors, _) in zip(obs, rows):
+                if ok:
+                    yield Result(index, True, self.on_success(ob, params), None)
+                else:
+                    yield Result(index, False, params, row_errors)
+                index += 1
+
+    def validate_batched_records(self, context, batched, obs, rows):
+        positions = [i for i, row in enumerate(rows) if row[0] is not None]
+        children = [rows[i][1] for i in positions]
+        errors = context.errors
+        for v in batched:
+            for position, ng in v.check_batch(self, children):
+                row = rows[positions[position]]
+                if row[3] == 0:
+                    continue
+                if row[0]:
+                    row[0], row[2] = False, self.make_errors()
+                context.ob = obs[positions[position]]
+                context.params = row[1]
+                context.errors = row[2]
+                context.status.budget = row[3]
+                self.dispatch(context, v, ng)
+                row[3] = context.status.budget
+        context.errors = errors
+
+    def avalidate(self, ob, concurrency=None, max_errors=None, fail_fast=None):
+        """validating with ``async def`` validators, returns an awaitable"""
+        from .aio import avalidate
+        return avalidate(self, ob, concurrency=concurrency or self.concurrency,
+                         budget=self.error_budget(max_errors, fail_fast))
 
     def configure(self, params):
         return params, {}
 
+    def configure_many(self, obs):
+        return [self.configure(ob) for ob in obs]
+
     def dispatch(self, context, validator, result):
         if result is OK:
             return
 
         if hasattr(result, "msg"):  # NG
-            context.status(False)
+            status = context.status
+            status(False)
             self.add_error(context.path, validator, result, context.errors)
             if isinstance(result, Interrupt):
-                self.on_failure(context.ob, context.params, context.errors)
+                status.budget = 0
+            elif status.budget is not None:
+                status.budget -= 1
+        elif iscoroutine(result):
+            reject_coroutine(validator, result)
 
     def add_error(self, path, validator, ng, errors):
         current = getattr(ng, "path", None)
         if current is None:
             current = getattr(validator, "path", None) or [validator.names[0]]
 
-        if not isinstance(current, (tuple, list)):
-            current = [current]
-
-        if path:
-            path = path + current
+        if isinstance(current, (tuple, list)):
+            full = tuple(path) + tuple(current)
         else:
-            path = current
-
-        target = errors
-        for p in path[:-1]:
-            try:
-                target = target[p]
-            except KeyError:
-                target[p] = {}
-                target = target[p]
-        try:
-            target[path[-1]].append(ng.msg)
-        except KeyError:
-            target[path[-1]] = []
-            target[path[-1]].append(ng.msg)
+            full = tuple(path) + (current, )
+        errors.add(full, ng.msg)
+        if getattr(ng, "path", None) is not None and getattr(validator, "names", None):
+            origin = tuple(path) + error_key(validator)
+            if origin != full:  # reported at another path, kept for revalidate()
+                errors.origin(full, ng.msg, origin)
 
     def on_success(self, _, params):
         return params
@@ -359,6 +1598,27 @@ class _Gardrail(object):
         raise Failure(errors)
 
     def on_missing(self, names, wrapname, fn):
-        return NG("fields:{} not found: {}.{}".format(names, wrapname, fn))
+        return NG(Message("fields:{} not found: {}.{}", names, wrapname, fn))
+
+    def on_unknown(self, names, wrapname, value):
+        return NG(Message("fields:{} unknown value: {!r} ({})", names, value, wrapname))
+
+
+def errors_from_dict(errors):
+    result = Errors()
+    for path, msg in flatten_errors(errors):
+        result.add(path, msg)
+    result.origins = getattr(errors, "origins", None)
+    return result
+
+
+def flatten_errors(errors, path=()):
+    for k, v in errors.items():
+        if hasattr(v, "items"):
+            for error in flatten_errors(v, path + (k, )):
+                yield error
+        else:
+            for msg in v:
+                yield path + (k, ), msg
 
 Gardrail = GardrailMeta("Gardrail", (_Gardrail, ), {})
@@ -0,0 +1,252 @@
+# -*- coding:utf-8 -*-
+"""
+asyncio support. validators defined with ``async def`` are awaited by ``Gardrail.avalidate()``.
+
+independent validators of a rail (and the elements of a collection) run concurrently with asyncio.gather,
+a Convert validator is a barrier (validators after it see its output).
+"""
+import asyncio
+from inspect import isawaitable
+from . import (
+    Context,
+    Errors,
+    Multi,
+    Matched,
+    Batched,
+    Dispatch,
+    DispatchOn,
+    Convert,
+    Subrail,
+    container,
+    collection,
+    materialize,
+    is_schedule,
+    merge_errors,
+    _Status
+)
+from .compat import iscoroutinefunction
+
+
+class Walker(object):
+    def __init__(self, scope, ob, status, errors, concurrency=None, semaphore=None):
+        self.scope = scope
+        self.ob = ob
+        self.status = status
+        self.errors = errors
+        self.semaphore = asyncio.Semaphore(concurrency) if concurrency else semaphore
+
+    def context(self, params, path):
+        # each task has its own context, errors are merged into the same errors
+        return Context(ob=self.ob, scope=self.scope, status=self.status, params=params, errors=self.errors, path=list(path))
+
+    def fork(self):
+        """a walker having its own errors and status (the error budget is copied), merged by flush() in order"""
+        return Walker(self.scope, self.ob, _Status(True, self.status.budget), Errors(), semaphore=self.semaphore)
+
+    async def nested(self, validators, params, path):
+        walker = self.fork()
+        await walker.walk(validators, params, path)
+        return walker
+
+    def merge(self, forked):
+        errors = forked.errors
+        merge_errors(self.context(None, ()), errors.entries, spent=forked.status.budget == 0, origins=errors.origins)
+
+    async def call(self, method, *args):
+        if self.semaphore is None:
+            return await method(self.scope, *args)
+        async with self.semaphore:
+            return await method(self.scope, *args)
+
+    def invoke(self, method, *args):
+        if iscoroutinefunction(method):
+            return self.call(method, *args)
+        return method(self.scope, *args)
+
+    def missing(self, v, fn):
+        return self.scope.on_missing(v.names, v.__class__.__name__, fn)
+
+    async def walk(self, validators, params, path):
+        if is_schedule(validators):
+            return await self.walk_schedule(validators, params, path)
+        tasks = []  # (validator, result or awaitable)
+        for v in validators:
+            if self.status.budget == 0:
+                break
+            if isinstance(v, Convert):
+                await self.flush(tasks, params, path)
+                tasks = []
+                await self.convert(v, params, path)
+                continue
+            self.add_task(v, params, path, tasks)
+        await self.flush(tasks, params, path)
+
+    async def walk_schedule(self, schedule, params, path):
+        # the validators of a level are awaited together, the errors of nested levels don't skip validators
+        failed = set()
+        for level in schedule.levels:
+            tasks = []
+            owners = []  # the node of each task
+            for node in level:
+                if self.status.budget == 0:
+                    return
+                if failed and node.skipped(failed):
+                    if node.writes:
+                        failed.update(node.writes)
+                    continue
+                v = node.validator
+                if isinstance(v, Convert):
+                    n = self.errors.count
+                    await self.convert(v, params, path)
+                    if self.errors.count != n:
+                        failed.update(node.fails)
+                    continue
+                size = len(tasks)
+                self.add_task(v, params, path, tasks)
+                owners.extend([node] * (len(tasks) - size))
+            for i in await self.flush(tasks, params, path):
+                failed.update(owners[i].fails)
+
+    def add_task(self, v, params, path, tasks):
+        for cls in v.__class__.__mro__:
+            handler = handlers.get(cls)
+            if handler is not None:
+                handler(self, v, params, path, tasks)
+                break
+        else:
+            v.validate_context(self.context(params, path))
+
+    async def flush(self, tasks, params, path):
+        """awaiting tasks together, returns the positions of the tasks found errors"""
+        futures = [asyncio.ensure_future(r) for _, r in tasks if isawaitable(r)]
+        try:
+            results = iter(await asyncio.gather(*futures))
+        except BaseException:
+            for f in futures:
+                f.cancel()
+            raise
+        failed = []
+        for i, (v, r) in enumerate(tasks):
+            if self.status.budget == 0:
+                break
+            if isawaitable(r):
+                r = next(results)
+            if v is None:  # a nested walk
+                self.merge(r)
+            elif r is not None:
+                self.scope.dispatch(self.context(params, path), v, r)
+                if hasattr(r, "msg"):
+                    failed.append(i)
+        return failed
+
+    async def convert(self, v, params, path):
+        if v.names and not all(params.get(name) is not None for name in v.names):
+            if v.strict:
+                self.scope.dispatch(self.context(params, path), v, self.missing(v, v.method))
+            return
+        result = self.invoke(v.method, params)
+        if isawaitable(result):
+            await result
+
+
+def _multi(walker, v, params, path, tasks):
+    if all(params.get(name) is not None for name in v.names):
+        tasks.append((v, walker.invoke(v.method, *(params.get(name) for name in v.names))))
+    elif v.strict:
+        tasks.append((v, walker.missing(v, v.method)))
+
+
+def _matched(walker, v, params, path, tasks):
+    if any(params.get(name) is not None for name in v.names):
+        tasks.append((v, walker.invoke(v.method, [params.get(name) for name in v.names if params.get(name) is not None])))
+    elif v.strict:
+        tasks.append((v, walker.missing(v, v.method)))
+
+
+def _batched(walker, v, params, path, tasks):
+    for _, ng in v.check_batch(walker.scope, [params]):
+        tasks.append((v, ng))
+
+
+def _nested(validators, fn, strict):
+    def handler(walker, v, params, path, tasks):
+        name = v.names[0]
+        if name in params:
+            tasks.append((None, walker.nested(validators(v), params[name], path + (name, ))))
+        elif strict(v):
+            tasks.append((v, walker.missing(v, fn(v))))
+    return handler
+
+
+def _collection(walker, v, params, path, tasks):
+    name = v.names[0]
+    if name in params:
+        children = v.children(params[name])
+        for i, child in enumerate(children):
+            tasks.append((None, walker.nested(v.validators, child, path + (name, i))))
+        if v.batched:  # after the elements, as validate_context()
+            forked = walker.fork()
+            tasks.append((None, forked))
+            for b in v.batched:
+                for i, ng in b.check_batch(walker.scope, children):
+                    if forked.status.budget == 0:
+                        return
+                    walker.scope.dispatch(forked.context(children[i], path + (name, i)), b, ng)
+    elif getattr(v.cls, "strict", False):
+        tasks.append((v, walker.missing(v, v.cls)))
+
+
+def _dispatch(walker, v, params, path, tasks):
+    if v.names and not all(params.get(name) is not None for name in v.names):
+        return
+    checks = []
+
+    def check(rail, child, path=[]):
+        if not isinstance(path, (list, tuple)):
+            path = [path]
+        checks.append((rail, child, path))
+    v.dispatch_method(walker.scope, check, params)
+    for rail, child, subpath in checks:
+        tasks.append((None, walker.nested(rail.validators, child, path + tuple(subpath))))
+
+def _dispatch_on(walker, v, params, path, tasks):
+    value = params.get(v.names[0])
+    if value is None:
+        if v.strict:
+            tasks.append((v, walker.missing(v, v.names[0])))
+        return
+    key = value if v.method is None else v.method(walker.scope, value)
+    try:
+        branch = v.branches.get(key)
+    except TypeError:  # unhashable
+        branch = None
+    if branch is None:
+        tasks.append((v, walker.scope.on_unknown(v.names, v.__class__.__name__, value)))
+    else:
+        tasks.append((None, walker.nested(branch.target.validators, params, path)))
+
+handlers = {
+    Multi: _multi,
+    Matched: _matched,
+    Batched: _batched,
+    container: _nested(lambda v: v.validators, lambda v: v.cls, lambda v: getattr(v.cls, "strict", False)),
+    Subrail: _nested(lambda v: v.Gardrail.validators, lambda v: v.Gardrail, lambda v: v.strict),
+    collection: _collection,
+    Dispatch: _dispatch,
+    DispatchOn: _dispatch_on,
+}
+
+
+async def avalidate(rail, ob, concurrency=None, budget=None):
+    params, errors = rail.configure(ob)
+    if errors:
+        return rail.on_failure(ob, params, errors)
+
+    errors = rail.make_errors()
+    status = _Status(True, budget)
+    params = rail.overlay(params)
+    await Walker(rail, ob, status, errors, concurrency=concurrency).walk(rail.validators, params, ())
+    if status:
+        return rail.on_success(ob, materialize(params))
+    else:
+        return rail.on_failure(ob, materialize(params), errors)
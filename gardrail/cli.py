@@ -0,0 +1,149 @@
+# -*- coding:utf-8 -*-
+"""
+validating NDJSON (or JSON) files with a Gardrail class.
+
+    $ python -m gardrail examples.registration:UserRegistrationValidation --args '[[]]' users.ndjson
+    {"line": 3, "errors": {"email": ["already registered"]}}
+
+errors are written to stdout as NDJSON, and a summary is written to stderr.
+"""
+import sys
+import json
+import time
+import argparse
+import importlib
+from collections import deque
+from . import Errors, flatten_errors
+
+BUFSIZE = 1 << 20
+
+
+def import_symbol(path):
+    if ":" in path:
+        module_name, name = path.split(":", 1)
+    else:
+        module_name, name = path.rsplit(".", 1)
+    ob = importlib.import_module(module_name)
+    for attr in name.split("."):
+        ob = getattr(ob, attr)
+    return ob
+
+
+def checked(record):
+    # a record must be a JSON object
+    if isinstance(record, dict):
+        return record
+    return ValueError("not an object")
+
+
+def iterate_records(fp, as_json=False):
+    """yielding (line, record or ValueError)"""
+    if as_json:
+        try:
+            data = json.loads(fp.read().decode("utf-8"))
+        except ValueError as e:
+            yield 1, ValueError("invalid json: {}".format(e))
+            return
+        for i, record in enumerate(data if isinstance(data, list) else [data]):
+            yield i + 1, checked(record)
+        return
+
+    for i, line in enumerate(fp):
+        line = line.strip()
+        if not line:
+            continue
+        try:
+            record = json.loads(line.decode("utf-8"))
+        except ValueError as e:
+            yield i + 1, ValueError("invalid json: {}".format(e))
+        else:
+            yield i + 1, checked(record)
+
+
+def build_parser():
+    parser = argparse.ArgumentParser(prog="gardrail", description="validating NDJSON/JSON files with a Gardrail class")
+    parser.add_argument("target", help="dotted path of a Gardrail class (e.g. package.module:ClassName)")
+    parser.add_argument("files", nargs="*", default=["-"], help="input files ('-' is stdin)")
+    parser.add_argument("--args", default="[]", help="constructor arguments, a JSON list")
+    parser.add_argument("--kwargs", default="{}", help="constructor keyword arguments, a JSON object")
+    parser.add_argument("--json", action="store_true", help="each file is a JSON document (a list of records), not NDJSON")
+    parser.add_argument("--workers", type=int, default=None, help="the number of worker processes")
+    parser.add_argument("--chunksize", type=int, default=1000, help="the number of records sent to a worker at a time")
+    parser.add_argument("--batch-size", type=int, default=1000)
+    parser.add_argument("--max-errors", type=int, default=None, help="the number of errors collected for each record")
+    parser.add_argument("--fail-fast", action="store_true", help="stopping at the first invalid record")
+    return parser
+
+
+def main(argv=None, stdin=None, stdout=None, stderr=None):
+    stdin = stdin or getattr(sys.stdin, "buffer", sys.stdin)
+    stdout = stdout or sys.stdout
+    stderr = stderr or sys.stderr
+    parser = build_parser()
+    args = getattr(parser, "parse_intermixed_args", parser.parse_args)(argv)
+    if args.max_errors is not None and args.max_errors < 1:
+        parser.error("--max-errors must be 1 or more")
+
+    rail = import_symbol(args.target)(*json.loads(args.args), **json.loads(args.kwargs))
+    positions = deque()  # (filename, line, error of json or None), in input order
+    counts = {"records": 0, "invalid": 0, "errors": 0}
+
+    def report(filename, line, errors):
+        counts["invalid"] += 1
+        if isinstance(errors, Errors):
+            counts["errors"] += errors.count
+            errors = errors.as_dict()
+        else:  # by configure()
+            counts["errors"] += sum(1 for _ in flatten_errors(errors))
+        output = {"line": line, "errors": errors}
+        if len(args.files) > 1:
+            output["file"] = filename
+        stdout.write(json.dumps(output, default=str))
+        stdout.write("\n")
+        return not args.fail_fast
+
+    def report_json_errors():
+        # invalid lines (and values not being objects) are not validated, they are reported in input order
+        while positions and positions[0][2] is not None:
+            filename, line, e = positions.popleft()
+            counts["records"] += 1
+            errors = Errors()
+            errors.add(("__json__", ), str(e))
+            if not report(filename, line, errors):
+                return False
+        return True
+
+    def records():
+        for filename in args.files:
+            fp = stdin if filename == "-" else open(filename, "rb", BUFSIZE)
+            try:
+                for line, record in iterate_records(fp, as_json=args.json):
+                    if isinstance(record, ValueError):
+                        positions.append((filename, line, record))
+                        continue
+                    positions.append((filename, line, None))
+                    yield record
+            finally:
+                if fp is not stdin:
+                    fp.close()
+
+    st = time.time()
+    results = rail.validate_many(records(), batch_size=args.batch_size, workers=args.workers, chunksize=args.chunksize,
+                                 max_errors=args.max_errors, fail_fast=args.fail_fast or None)
+    continued = True
+    for result in results:
+        continued = report_json_errors()
+        if not continued:
+            break
+        filename, line, _ = positions.popleft()
+        counts["records"] += 1
+        if not result.ok and not report(filename, line, result.errors):
+            continued = False
+            break
+    if continued:
+        report_json_errors()
+    elapsed = time.time() - st
+
+    stderr.write("records: {records}, invalid: {invalid}, errors: {errors}, ".format(**counts))
+    stderr.write("elapsed: {:.3f}s, {:.0f} records/sec\n".format(elapsed, counts["records"] / elapsed if elapsed else 0))
+    return 1 if counts["invalid"] else 0
@@ -3,9 +3,46 @@ import sys
 
 PY3 = sys.version_info[0] == 3
 
+if PY3:
+    literal_types = (str, int)
+else:
+    literal_types = (str, unicode, int, long)  # NOQA
+
 
 def assert_regex(unittest_self, *args, **kwargs):
     if PY3:
         return unittest_self.assertRegex(*args, **kwargs)
     else:
         return unittest_self.assertRegexpMatches(*args, **kwargs)
+
+CO_COROUTINE = 0x80
+
+
+def iscoroutinefunction(fn):
+    # same as inspect.iscoroutinefunction(), without importing inspect
+    return PY3 and bool(getattr(getattr(fn, "__code__", None), "co_flags", 0) & CO_COROUTINE)
+
+
+def iscoroutine(ob):
+    # the result of calling an async def function
+    return hasattr(ob, "cr_code")
+
+try:
+    import numpy
+except ImportError:
+    numpy = None
+
+try:
+    from collections.abc import Mapping
+except ImportError:
+    from collections import Mapping
+
+try:
+    from time import perf_counter
+except ImportError:
+    from time import time as perf_counter
+
+try:
+    from collections.abc import MutableMapping, Sequence
+except ImportError:
+    from collections import MutableMapping, Sequence
@@ -0,0 +1,203 @@
+# -*- coding:utf-8 -*-
+"""
+incremental validation. only the validators reading the changed fields are run again,
+and their results are spliced into the previous errors.
+
+changed fields are names, or paths (e.g. ``("points", 1, "x")``).
+"""
+import threading
+import weakref
+from . import (
+    Context,
+    Errors,
+    Multi,
+    Matched,
+    Batched,
+    Convert,
+    Subrail,
+    container,
+    collection,
+    error_key,
+    flatten_errors,
+    message,
+    materialize,
+    validate_all,
+    _Status
+)
+
+LEAVES = (Multi, Matched, Batched, Convert)
+NESTED = (container, collection, Subrail)
+
+
+def output_field(v):
+    """the field written by a convert (the first element of a list path)"""
+    path = v.path
+    return path[0] if isinstance(path, (list, tuple)) else path
+
+
+class FieldIndex(object):
+    """validators of a level, indexed by the names of fields they read and the keys of errors they write"""
+
+    def __init__(self, validators):
+        self.validators = validators
+        self.by_name = {}
+        self.by_key = {}
+        self.opaque = False  # if True, the level cannot be projected (e.g. Dispatch)
+        for v in validators:
+            if isinstance(v, Convert) and not (v.names and v.path):
+                self.opaque = True
+            elif isinstance(v, LEAVES):
+                for name in v.names:
+                    self.by_name.setdefault(name, []).append(v)
+                self.by_key.setdefault(error_key(v), []).append(v)
+            elif isinstance(v, NESTED):
+                self.by_name.setdefault(v.names[0], []).append(v)
+            else:
+                self.opaque = True
+
+    def select(self, projection):
+        """returns (selected validators, projection), or None if all validators are needed"""
+        if self.opaque:
+            return None
+        projection = dict(projection)
+        selected = set()
+        pending = [v for name in projection for v in self.by_name.get(name, ())]
+        while pending:
+            v = pending.pop()
+            if v in selected:
+                continue
+            selected.add(v)
+            if isinstance(v, Convert):  # the output is changed, too
+                field = output_field(v)
+                projection[field] = True
+                pending.extend(self.by_name.get(field, ()))
+            if isinstance(v, LEAVES):  # validators writing the same errors
+                pending.extend(self.by_key[error_key(v)])
+        return selected, projection
+
+
+_indexes = weakref.WeakKeyDictionary()
+_lock = threading.Lock()
+
+
+def field_index(owner, validators):
+    with _lock:
+        index = _indexes.get(owner)
+        if index is None or index.validators is not validators:
+            index = _indexes[owner] = FieldIndex(validators)
+        return index
+
+
+def make_projection(fields):
+    tree = {}
+    for field in fields:
+        path = tuple(field) if isinstance(field, (list, tuple)) else (field, )
+        target = tree
+        for p in path[:-1]:
+            target = target.setdefault(p, {})
+            if target is True:
+                break
+        else:
+            target[path[-1]] = True
+    return tree
+
+
+def walk(context, owner, validators, projection, owned):
+    path = tuple(context.path)
+    selection = field_index(owner, validators).select(projection)
+    if selection is None:
+        owned.add(path)
+        return validate_all(context, validators)
+
+    selected, projection = selection
+    for v in validators:
+        if v not in selected:
+            continue
+        if isinstance(v, LEAVES):
+            owned.add(path + error_key(v))
+            v.validate_context(context)
+        else:
+            walk_nested(context, v, projection[v.names[0]], owned)
+        if context.status.budget == 0:
+            return
+
+
+def walk_nested(context, v, projection, owned):
+    name = v.names[0]
+    path = tuple(context.path) + (name, )
+    if projection is True or name not in context.params:
+        owned.add(path)
+        return v.validate_context(context)
+    if isinstance(v, collection) and (v.batched or not all(isinstance(i, int) for i in projection)):
+        owned.add(path)
+        return v.validate_context(context)
+
+    original = context.params
+    context.path.append(name)
+    context.params = original[name]
+    if isinstance(v, collection):
+        children = v.children(context.params)
+        for i, subprojection in sorted(projection.items()):
+            if not (0 <= i < len(children)):  # removed
+                owned.add(path + (i, ))
+                continue
+            context.path.append(i)
+            context.params = children[i]
+            walk(context, v, v.validators, subprojection, owned)
+            context.path.pop()
+            if context.status.budget == 0:
+                break
+    elif isinstance(v, Subrail):
+        target = v.Gardrail if isinstance(v.Gardrail, type) else v.Gardrail.__class__
+        walk(context, target, v.Gardrail.validators, projection, owned)
+    else:
+        walk(context, v, v.validators, projection, owned)
+    context.params = original
+    context.path.pop()
+
+
+def is_owned(path, owned):
+    return any(path[:i] in owned for i in range(len(path) + 1))
+
+
+def splice(previous, fresh, owned):
+    """previous errors of the validators not run again, and fresh errors.
+    errors reported at other paths (NG(msg, path=...)) are dropped by the key of their validator.
+    """
+    errors = Errors()
+    if previous:
+        entries = previous.entries if isinstance(previous, Errors) else flatten_errors(previous)
+        origins = getattr(previous, "origins", None) or {}
+        for path, msg in entries:
+            if is_owned(path, owned):
+                continue
+            origin = origins.get((path, message(msg)))
+            if origin is not None:
+                if is_owned(origin, owned):
+                    continue
+                errors.origin(path, msg, origin)
+            errors.add(path, msg)
+    origins = fresh.origins or {}
+    for path, msg in fresh.entries:
+        errors.add(path, msg)
+        origin = origins.get((path, message(msg)))
+        if origin is not None:
+            errors.origin(path, msg, origin)
+    return errors
+
+
+def revalidate(rail, ob, changed, previous_errors=None, max_errors=None, fail_fast=None):
+    budget = rail.error_budget(max_errors, fail_fast)  # for the validators run again
+    params, errors = rail.configure(ob)
+    if errors:
+        return rail.on_failure(ob, params, errors)
+
+    fresh = Errors()
+    params = rail.overlay(params)
+    context = Context(ob=ob, scope=rail, status=_Status(True, budget), params=params, errors=fresh, path=[])
+    owned = set()
+    walk(context, rail.__class__, rail.validators, make_projection(changed), owned)
+    errors = splice(previous_errors, fresh, owned)
+    if errors:
+        return rail.on_failure(ob, materialize(params), errors)
+    return rail.on_success(ob, materialize(params))
@@ -0,0 +1,94 @@
+# -*- coding:utf-8 -*-
+"""
+per-validator statistics. validators are timed by an instrumented plan, only while a collector is set.
+
+.. code:: python
+
+    with validation.instrument() as collector:
+        for params in records:
+            validation(params)
+    print(collector.report())
+"""
+import threading
+from collections import namedtuple, deque
+
+# owner is the name of the class defining the validator, path is the names of the nested levels
+Key = namedtuple("Key", "owner name path")
+
+
+def validator_name(v):
+    for attr in ("method", "dispatch_method", "cls", "Gardrail"):
+        fn = getattr(v, attr, None)
+        if fn is not None:
+            return getattr(fn, "__name__", None) or fn.__class__.__name__
+    return v.__class__.__name__
+
+
+class Stats(object):
+    def __init__(self, samples):
+        self.calls = 0
+        self.failures = 0
+        self.total = 0.0
+        self.samples = deque(maxlen=samples)  # the most recent timings
+
+    def record(self, elapsed, errors):
+        self.calls += 1
+        self.total += elapsed
+        self.samples.append(elapsed)
+        if errors:
+            self.failures += 1
+
+    @property
+    def mean(self):
+        return self.total / self.calls if self.calls else 0.0
+
+    @property
+    def failure_rate(self):
+        return float(self.failures) / self.calls if self.calls else 0.0
+
+    def percentile(self, q):
+        if not self.samples:
+            return 0.0
+        samples = sorted(self.samples)
+        return samples[min(len(samples) - 1, int(len(samples) * q))]
+
+    @property
+    def p99(self):
+        return self.percentile(0.99)
+
+
+class Collector(object):
+    """an in-memory collector. the time of container, collection and subrail includes their validators
+
+    it can be shared by threads validating concurrently.
+    """
+
+    def __init__(self, samples=1024):
+        self.samples = samples
+        self.stats = {}  # Key -> Stats
+        self.lock = threading.Lock()
+
+    def record(self, key, elapsed, errors):
+        with self.lock:
+            stats = self.stats.get(key)
+            if stats is None:
+                stats = self.stats[key] = Stats(self.samples)
+            stats.record(elapsed, errors)
+
+    def clear(self):
+        with self.lock:
+            self.stats.clear()
+
+    def report(self, limit=None):
+        lines = ["{:<48} {:>8} {:>8} {:>10} {:>10} {:>10}".format(
+            "validator", "calls", "failed%", "total(ms)", "mean(us)", "p99(us)")]
+        with self.lock:
+            rows = sorted(self.stats.items(), key=lambda item: item[1].total, reverse=True)[:limit]
+            for key, stats in rows:
+                name = ".".join((key.owner, key.name))
+                if key.path:
+                    name = "{} @{}".format(name, ".".join(str(p) for p in key.path))
+                lines.append("{:<48} {:>8} {:>8.1f} {:>10.3f} {:>10.1f} {:>10.1f}".format(
+                    name, stats.calls, stats.failure_rate * 100, stats.total * 1e3, stats.mean * 1e6,
+                    stats.p99 * 1e6))
+        return "\n".join(lines)
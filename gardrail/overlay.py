@@ -0,0 +1,181 @@
+# -*- coding:utf-8 -*-
+"""
+copy-on-write params. the input is read through an overlay, and writes (e.g. by convert) are kept in the overlay.
+nested dicts and lists are wrapped at the first access by ``[]``, so only the levels written are copied by ``materialize()``.
+``get()`` is the fetch of validators, returning the values themselves (not wrapped).
+"""
+from .compat import MutableMapping, Sequence
+
+_deleted = object()
+
+
+def wrap(value):
+    if isinstance(value, dict):
+        return Overlay(value)
+    elif isinstance(value, (list, tuple)):
+        return OverlayList(value)
+    return value
+
+
+def materialize(value):
+    if value.__class__ is Overlay or value.__class__ is OverlayList:  # not isinstance(), checked by ABCMeta
+        return value.materialize()
+    return value
+
+
+class Overlay(MutableMapping):
+    """a copy-on-write view of a dict"""
+    __slots__ = ("original", "written", "children")
+
+    def __init__(self, original):
+        self.original = original
+        self.written = None  # key -> value (or _deleted), created at the first write
+        self.children = None  # key -> the wrapped nested value
+
+    def __getitem__(self, k):
+        written = self.written
+        if written is not None and k in written:
+            value = written[k]
+            if value is _deleted:
+                raise KeyError(k)
+            return value
+        value = self.original[k]
+        if isinstance(value, (dict, list, tuple)):
+            children = self.children
+            if children is None:
+                children = self.children = {}
+            child = children.get(k)
+            if child is None:
+                child = children[k] = wrap(value)
+            return child
+        return value
+
+    def get(self, k, default=None):
+        # the value as a validator sees it, the input's own unless a convert has written into it
+        written = self.written
+        if written is not None and k in written:
+            value = written[k]
+            return default if value is _deleted else value
+        value = self.original.get(k, default)
+        children = self.children
+        if children is not None and k in children:
+            return children[k].materialize()
+        return value
+
+    def __contains__(self, k):
+        written = self.written
+        if written is not None and k in written:
+            return written[k] is not _deleted
+        return k in self.original
+
+    def __setitem__(self, k, value):
+        if self.written is None:
+            self.written = {}
+        self.written[k] = value
+
+    def __delitem__(self, k):
+        if k not in self:
+            raise KeyError(k)
+        self[k] = _deleted
+
+    def __iter__(self):
+        written = self.written or {}
+        for k in self.original:
+            if written.get(k) is not _deleted:
+                yield k
+        for k, value in written.items():
+            if value is not _deleted and k not in self.original:
+                yield k
+
+    def __len__(self):
+        return sum(1 for _ in self)
+
+    def __repr__(self):
+        return "<Overlay {!r}>".format(self.materialize())
+
+    def materialize(self):
+        """the original if nothing is written, otherwise a shallow copy of this level with the changes"""
+        changed = {}
+        for k, child in (self.children or {}).items():
+            value = child.materialize()
+            if value is not child.original:
+                changed[k] = value
+        if not self.written and not changed:
+            return self.original
+        result = self.original.copy()
+        result.update(changed)
+        for k, value in (self.written or {}).items():
+            if value is _deleted:
+                result.pop(k, None)
+            else:
+                result[k] = materialize(value)
+        return result
+
+
+class OverlayList(Sequence):
+    """a copy-on-write view of a list, elements are wrapped (lists are not written)
+
+    it compares equal to a list (a tuple) as the original does, but it is not an instance of list.
+    """
+    __slots__ = ("original", "children")
+
+    def __init__(self, original):
+        self.original = original
+        self.children = None  # index -> the wrapped element
+
+    def __getitem__(self, i):
+        if isinstance(i, slice):
+            return [self[j] for j in range(*i.indices(len(self.original)))]
+        value = self.original[i]
+        if isinstance(value, (dict, list, tuple)):
+            children = self.children
+            if children is None:
+                children = self.children = {}
+            i = i % len(self.original)
+            child = children.get(i)
+            if child is None:
+                child = children[i] = wrap(value)
+            return child
+        return value
+
+    def __len__(self):
+        return len(self.original)
+
+    def __iter__(self):
+        for i in range(len(self.original)):
+            yield self[i]
+
+    def __eq__(self, other):
+        # same as the original, a list equals to a list and a tuple to a tuple
+        if other.__class__ is OverlayList:
+            kind = other.original.__class__
+        elif isinstance(other, (list, tuple)):
+            kind = other.__class__
+        else:
+            return NotImplemented
+        if isinstance(self.original, list) != issubclass(kind, list):
+            return False
+        return len(self) == len(other) and all(a == b for a, b in zip(self, other))
+
+    def __ne__(self, other):
+        result = self.__eq__(other)
+        return result if result is NotImplemented else not result
+
+    def __hash__(self):
+        return hash(self.materialize())  # TypeError for a list, as the original
+
+    def __repr__(self):
+        return "<OverlayList {!r}>".format(self.materialize())
+
+    def materialize(self):
+        changed = {}
+        for i, child in (self.children or {}).items():
+            value = child.materialize()
+            if value is not child.original:
+                changed[i] = value
+        if not changed:
+            return self.original
+        result = list(self.original)
+        for i, value in changed.items():
+            result[i] = value
+        return self.original.__class__(result) if isinstance(self.original, tuple) else result
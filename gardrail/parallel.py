@@ -0,0 +1,48 @@
+# -*- coding:utf-8 -*-
+"""
+running Gardrail.validate_many() on a process pool.
+
+the Gardrail instance is pickled once, and rebuilt at each worker process.
+if an instance has unpicklable attributes (e.g. a db connection), define ``__reduce__``
+(or ``__getstate__``/``__setstate__``) to declare how it is rebuilt in a worker.
+"""
+import pickle
+from collections import deque
+from itertools import islice
+from concurrent.futures import ProcessPoolExecutor
+
+_rail = None
+
+
+def _initialize(payload):
+    global _rail
+    _rail = pickle.loads(payload)
+
+
+def _validate_chunk(start, obs, budget):
+    results = _rail.validate_many(obs, batch_size=len(obs), max_errors=budget, fail_fast=False)
+    return [r._replace(index=start + r.index) for r in results]
+
+
+def validate_parallel(rail, iterable, workers, chunksize, budget=None):
+    try:
+        payload = pickle.dumps(rail, pickle.HIGHEST_PROTOCOL)
+    except (pickle.PicklingError, TypeError, AttributeError) as e:
+        raise TypeError("{!r} cannot be sent to workers, define __reduce__ for rebuilding it: {}".format(rail, e))
+
+    iterator = iter(iterable)
+    with ProcessPoolExecutor(workers, initializer=_initialize, initargs=(payload, )) as executor:
+        pending = deque()
+        start = 0
+        while True:
+            # a bounded number of chunks are in flight, results are merged in input order
+            while len(pending) < workers * 2:
+                obs = list(islice(iterator, chunksize))
+                if not obs:
+                    break
+                pending.append(executor.submit(_validate_chunk, start, obs, budget))
+                start += len(obs)
+            if not pending:
+                return
+            for result in pending.popleft().result():
+                yield result
@@ -0,0 +1,148 @@
+# -*- coding:utf-8 -*-
+"""
+dependency-aware scheduling, enabled by ``scheduled = True`` on a Gardrail (or container/collection) class.
+
+- a validator reads the fields of its names, and a convert having names and path writes the field of its path.
+  a convert without them may write anything, and keeps the order of definition with all validators
+- a field is read after it is written (unless the convert reads it too, i.e. converts in place);
+  validators sharing a field keep the order of definition,
+  the others are independent. the validators are grouped into levels, each level depends on the previous ones
+- a validator reading a field having errors is skipped (a skipped convert doesn't write its field).
+  validators whose fields are unknown (e.g. dispatch(), dispatch_on()) are never skipped
+- with ``threads = N``, the validators of a level run on the thread pool, and ``avalidate()`` awaits them together
+  (not while instrumented, the validators are recorded one by one)
+"""
+from . import Convert, Dispatch, DispatchOn
+from .compat import perf_counter
+
+
+def _field(path):
+    return path[0] if isinstance(path, (list, tuple)) else path
+
+
+class Node(object):
+    def __init__(self, v):
+        self.validator = v
+        names = getattr(v, "names", None)
+        if not names or isinstance(v, (Dispatch, DispatchOn)):
+            self.reads = None  # unknown
+        else:
+            self.reads = frozenset(names)
+        if isinstance(v, Convert):
+            self.writes = frozenset([_field(v.path)]) if v.names and v.path else None
+        else:
+            self.writes = frozenset()
+        # the fields marked as failed when the validator finds errors
+        if self.reads is None:
+            self.fails = frozenset()
+        else:
+            self.fails = frozenset([_field(getattr(v, "path", None) or names[0])])
+        self.depends = set()
+
+    def fields(self):
+        return self.reads | self.writes
+
+    def skipped(self, failed):
+        return self.reads is not None and not failed.isdisjoint(self.reads)
+
+
+def depends(a, b):
+    """the relation of a and b (a is defined before b): 1 if b depends on a, -1 if a depends on b, else 0"""
+    if a.reads is None or b.reads is None or a.writes is None or b.writes is None:
+        return 1
+    written = b.writes & a.reads
+    if written and written.isdisjoint(b.reads) and a.writes.isdisjoint(b.fields()):
+        return -1  # a reads the field written by b (an in-place convert keeps the order, a checks its input)
+    if not a.fields().isdisjoint(b.fields()):
+        return 1
+    return 0
+
+
+def levels(nodes):
+    for i, a in enumerate(nodes):
+        for b in nodes[i + 1:]:
+            relation = depends(a, b)
+            if relation > 0:
+                b.depends.add(a)
+            elif relation < 0:
+                a.depends.add(b)
+
+    level = {}
+    pending = list(nodes)
+    while pending:
+        ready = [node for node in pending if all(d in level for d in node.depends)]
+        if not ready:
+            raise ValueError("cyclic dependencies: {}".format(
+                ", ".join(getattr(node.validator, "names", [repr(node.validator)])[0] for node in pending)))
+        for node in ready:
+            level[node] = max([level[d] + 1 for d in node.depends] or [0])
+        pending = [node for node in pending if node not in level]
+
+    result = [[] for _ in range(max(level.values()) + 1)] if level else []
+    for node in nodes:
+        result[level[node]].append(node)
+    return result
+
+
+class Schedule(list):
+    """validators in the order of the levels of their dependencies"""
+
+    def __init__(self, validators):
+        self.levels = levels([Node(v) for v in validators])
+        super(Schedule, self).__init__(node.validator for level in self.levels for node in level)
+
+    def run(self, context, threads=None, keys=None):
+        """keys are {node: instrument.Key}, if given, each validator is recorded into context.collector"""
+        status = context.status
+        failed = set()  # fields having errors, at this level
+        for level in self.levels:
+            nodes = []
+            for node in level:
+                if failed and node.skipped(failed):
+                    if node.writes:
+                        failed.update(node.writes)
+                else:
+                    nodes.append(node)
+
+            if threads and len(nodes) > 1 and keys is None:
+                from .threads import run_threaded
+                jobs = [([node.validator], context.params, list(context.path)) for node in nodes]
+                for node, ok in zip(nodes, run_threaded(context, threads, jobs)):
+                    if ok is False:
+                        failed.update(node.fails)
+            else:
+                errors = context.errors
+                for node in nodes:
+                    n = errors.count
+                    if keys is None:
+                        node.validator.validate_context(context)
+                    else:
+                        t = perf_counter()
+                        try:
+                            node.validator.validate_context(context)
+                        finally:
+                            context.collector.record(keys[node], perf_counter() - t, errors.count - n)
+                    if errors.count != n:
+                        failed.update(node.fails)
+                    if status.budget == 0:
+                        return
+            if status.budget == 0:
+                return
+
+
+def scheduled_plan(cls, instrumented=False):
+    """a plan running the schedule of cls, the levels are run on the pool if cls.threads is set
+
+    an instrumented plan records each validator (nested ones are timed with their container), and runs in order.
+    """
+    schedule = cls.validators
+    keys = None
+    if instrumented:
+        from .instrument import Key, validator_name
+        keys = dict((node, Key(cls.__name__, validator_name(node.validator), ()))
+                    for level in schedule.levels for node in level)
+
+    def plan(scope, context):
+        schedule.run(context, threads=cls.threads, keys=keys)
+    plan.source = None
+    return plan
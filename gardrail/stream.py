@@ -0,0 +1,157 @@
+# -*- coding:utf-8 -*-
+"""
+streaming validation of huge arrays. a collection consumes an iterator element by element,
+so with a JSON file read incrementally, the memory is bounded by one element (and the errors).
+
+.. code:: python
+
+    with open("points.json") as rf:
+        validation(stream_object(rf, "points"))  # {"points": [...], ...}
+
+batched validators, ``threads`` and ``avalidate()`` read all elements of a collection at once.
+"""
+import re
+import json
+
+WHITESPACE = re.compile(r"[ \t\n\r]*")
+
+
+class JSONStream(object):
+    """reading JSON values from a file object, a chunk at a time"""
+
+    def __init__(self, fp, chunksize=1 << 16):
+        self.fp = fp
+        self.chunksize = chunksize
+        self.decoder = json.JSONDecoder()
+        self.buf = ""
+        self.pos = 0
+        self.eof = False
+
+    def fill(self):
+        chunk = self.fp.read(self.chunksize)
+        if not chunk:
+            self.eof = True
+            return False
+        self.buf = self.buf[self.pos:] + chunk
+        self.pos = 0
+        return True
+
+    def peek(self):
+        """the next non-whitespace character"""
+        while True:
+            self.pos = WHITESPACE.match(self.buf, self.pos).end()
+            if self.pos < len(self.buf):
+                return self.buf[self.pos]
+            if not self.fill():
+                raise ValueError("unexpected end of JSON")
+
+    def expect(self, chars):
+        c = self.peek()
+        if c not in chars:
+            raise ValueError("expected {!r}, but {!r} at {}".format(chars, c, self.pos))
+        self.pos += 1
+        return c
+
+    def value(self):
+        self.peek()
+        while True:
+            try:
+                value, end = self.decoder.raw_decode(self.buf, self.pos)
+            except ValueError:
+                if self.fill():
+                    continue
+                raise
+            if end == len(self.buf) and not self.eof and self.fill():  # e.g. a number may continue
+                continue
+            self.pos = end
+            return value
+
+    def iter_array(self):
+        self.expect("[")
+        if self.peek() == "]":
+            self.pos += 1
+            return
+        while True:
+            yield self.value()
+            if self.expect(",]") == "]":
+                return
+
+
+def iter_array(fp, chunksize=1 << 16):
+    """yielding each element of a top level JSON array"""
+    return JSONStream(fp, chunksize).iter_array()
+
+
+class StreamedObject(dict):
+    """the fields of an object streaming its array. the fields after the array are added when it is exhausted
+
+    reading a field after the array before that is an error (ValueError is raised at the end of the array),
+    not to validate it as missing.
+    """
+
+    def __init__(self, name):
+        super(StreamedObject, self).__init__()
+        self.name = name
+        self.pending = False  # the array is not exhausted
+        self.missed = set()  # the fields not found while pending
+
+    def __getitem__(self, k):
+        try:
+            return dict.__getitem__(self, k)
+        except KeyError:
+            if self.pending:
+                self.missed.add(k)
+            raise
+
+    def get(self, k, default=None):
+        if dict.__contains__(self, k):
+            return dict.__getitem__(self, k)
+        if self.pending:
+            self.missed.add(k)
+        return default
+
+    def __contains__(self, k):
+        if dict.__contains__(self, k):
+            return True
+        if self.pending:
+            self.missed.add(k)
+        return False
+
+    def add(self, k, value):
+        if k in self.missed:
+            raise ValueError("the field {!r} is after the array {!r}, but it was read before the array was consumed "
+                             "(put it before the array)".format(k, self.name))
+        dict.__setitem__(self, k, value)
+
+
+def stream_object(fp, name, chunksize=1 << 16):
+    """a top level JSON object, the array of the name is an iterator of its elements (see StreamedObject)
+
+    the fields after the array are read (and added to the dict) when the iterator is exhausted.
+    """
+    stream = JSONStream(fp, chunksize)
+    params = StreamedObject(name)
+    stream.expect("{")
+    if stream.peek() == "}":
+        return params
+    while True:
+        key = stream.value()
+        stream.expect(":")
+        if key == name and stream.peek() == "[":
+            params[key] = _streaming(stream, params)
+            params.pending = True
+            return params
+        params[key] = stream.value()
+        if stream.expect(",}") == "}":
+            return params
+
+
+def _streaming(stream, params):
+    for element in stream.iter_array():
+        yield element
+    # the rest of the object
+    while stream.expect(",}") == ",":
+        key = stream.value()
+        stream.expect(":")
+        params.add(key, stream.value())
+    params.pending = False
@@ -0,0 +1,147 @@
+# -*- coding:utf-8 -*-
+"""
+caching the results of subtrees, for documents sharing a sub-document (or repeating the same one).
+
+``subtree_cache`` on a container/collection class, or on the Gardrail class used by a subrail:
+
+- ``True`` the result of a subtree is reused for the same object in a call (by identity)
+- ``N`` also reused for a structurally equal subtree across calls (LRU of N)
+
+the errors are stored relative to the subtree, and re-rooted at the path of each occurrence.
+the validators of a cached subtree must be pure, i.e. depend on the subtree only.
+a subtree including unhashable values (other than dict and list) is not cached by its structure.
+subtrees validated with convert (or dispatch()) are not cached, convert must be run for each occurrence.
+"""
+import threading
+import weakref
+from collections import OrderedDict
+from . import (
+    CacheInfo,
+    Convert,
+    Dispatch,
+    DispatchOn,
+    Subrail,
+    container,
+    collection,
+    fork_context,
+    merge_errors,
+    validate_all
+)
+
+_shared = weakref.WeakKeyDictionary()
+_lock = threading.Lock()
+_scalars = frozenset([str, bytes, int, float, bool, type(None)])
+
+
+def freeze(value):
+    """a hashable key for the structure of the value"""
+    t = type(value)
+    if t is dict or (t not in _scalars and isinstance(value, dict)):
+        return (dict, frozenset([(k, freeze(v)) for k, v in value.items()]))
+    elif t is list or t is tuple:
+        return (t, tuple([freeze(v) for v in value]))
+    hash(value)  # TypeError if unhashable
+    return (t, value)
+
+
+def writes(validators, seen=None):
+    """True if the validators (or nested ones) may change params, i.e. convert or unknown rails of dispatch()"""
+    seen = set() if seen is None else seen
+    if id(validators) in seen:  # recursive
+        return False
+    seen.add(id(validators))
+    for v in validators:
+        if isinstance(v, (Convert, Dispatch)):
+            return True
+        elif isinstance(v, (container, collection)):
+            nested = [v.validators]
+        elif isinstance(v, Subrail):
+            nested = [v.Gardrail.validators]
+        elif isinstance(v, DispatchOn):
+            nested = [target.validators for target in v.table.values()]
+        else:
+            continue
+        if any(writes(validators, seen) for validators in nested):
+            return True
+    return False
+
+
+class SubtreeCache(object):
+    def __init__(self, maxsize=None):
+        self.maxsize = maxsize
+        self.cache = OrderedDict()
+        self.lock = threading.Lock()
+        self.hits = self.misses = self.evictions = 0
+        self.checked = None  # the validators checked by writes()
+        self.bypass = False
+
+    def validate(self, context, validators):
+        """validating context.params (the path is already pushed)"""
+        if self.checked is not validators:
+            self.bypass = writes(validators)
+            self.checked = validators
+        if self.bypass:  # convert is run for each occurrence
+            return validate_all(context, validators)
+
+        calls = context.subtrees
+        if calls is None:
+            calls = context.subtrees = {}
+        params = context.params
+        ikey = (id(self), id(params))
+        found = calls.get(ikey)
+        if found is not None:
+            with self.lock:
+                self.hits += 1
+            entries, origins = found[1]
+            return merge_errors(context, entries, prefix=tuple(context.path), origins=origins)
+
+        key = result = None
+        if self.maxsize:
+            try:
+                key = freeze(params)
+                with self.lock:
+                    result = self.cache.pop(key)
+                    self.cache[key] = result
+                    self.hits += 1
+            except KeyError:
+                pass
+            except TypeError:  # unhashable
+                key = None
+
+        complete = True
+        if result is None:
+            result, complete = self.run(context, validators, params)
+            with self.lock:
+                self.misses += 1
+                if complete and key is not None:
+                    self.cache[key] = result
+                    if len(self.cache) > self.maxsize:
+                        self.cache.popitem(last=False)
+                        self.evictions += 1
+        if complete:  # not cut by the error budget
+            calls[ikey] = (params, result)  # keeping params, its id is not reused in the call
+        entries, origins = result
+        merge_errors(context, entries, spent=not complete, prefix=tuple(context.path), origins=origins)
+
+    def run(self, context, validators, params):
+        forked = fork_context(context, params, [])
+        forked.subtrees = context.subtrees
+        validate_all(forked, validators)
+        return (tuple(forked.errors.entries), forked.errors.origins), forked.status.budget != 0
+
+    def cache_info(self):
+        return CacheInfo(self.hits, self.misses, self.evictions, self.maxsize, len(self.cache))
+
+    def cache_clear(self):
+        with self.lock:
+            self.cache.clear()
+            self.hits = self.misses = self.evictions = 0
+
+
+def shared_cache(owner, maxsize=None):
+    """the cache of subtrees validated by the Gardrail class"""
+    with _lock:
+        cache = _shared.get(owner)
+        if cache is None or cache.maxsize != maxsize:
+            cache = _shared[owner] = SubtreeCache(maxsize)
+        return cache
@@ -0,0 +1,208 @@
+# -*- coding:utf-8 -*-
+import unittest
+from evilunit import test_target
+from gardrail import Gardrail, NG, single
+from gardrail.compat import assert_regex
+
+
+@test_target("gardrail:Gardrail.avalidate")
+class AvalidateTests(unittest.TestCase):
+    def _makeOne(self, log):
+        import asyncio
+        from gardrail import collection, multi
+
+        class G(Gardrail):
+            concurrency = 2
+
+            @single("email", strict=True)
+            async def email_check(self, email):
+                log.append(email)
+                await asyncio.sleep(0.01)
+                log.pop()
+                if email == "foo@example.com":
+                    return NG("already registered")
+
+            @collection
+            class points:
+                @multi(["x", "y"])
+                async def positive(self, x, y):
+                    log.append(x)
+                    self.peak = max(getattr(self, "peak", 0), len(log))
+                    await asyncio.sleep(0.01)
+                    log.pop()
+                    if not (x > 0 and y > 0):
+                        return NG("oops")
+
+                @single("x")
+                def small(self, x):
+                    if x > 100:
+                        return NG("too large")
+        return G()
+
+    def _run(self, target, params, **kwargs):
+        import asyncio
+        loop = asyncio.new_event_loop()
+        try:
+            return loop.run_until_complete(target.avalidate(params, **kwargs))
+        finally:
+            loop.close()
+
+    def test_success(self):
+        target = self._makeOne([])
+        params = {"email": "bar@example.com", "points": [{"x": 1, "y": 1}] * 5}
+        self.assertEqual(self._run(target, params), params)
+        self.assertEqual(target.peak, 2)
+
+    def test_failure(self):
+        from gardrail import Failure
+        target = self._makeOne([])
+        params = {"email": "foo@example.com", "points": [{"x": 1, "y": 1}, {"x": -1, "y": 1}, {"x": 1000, "y": 1}]}
+        with self.assertRaises(Failure) as e:
+            self._run(target, params)
+        self.assertEqual(e.exception.errors, {"email": ["already registered"],
+                                              "points": {1: {"x": ["oops"]}, 2: {"x": ["too large"]}}})
+
+    def test_failure__if_strict_True__missing(self):
+        from gardrail import Failure
+        target = self._makeOne([])
+        with self.assertRaises(Failure) as e:
+            self._run(target, {})
+        assert_regex(self, e.exception.errors["email"][0], "fields:\['email'\] not found")
+
+    def test_sync_call_is_not_allowed(self):
+        target = self._makeOne([])
+        with self.assertRaises(TypeError):
+            target({"email": "bar@example.com"})
+
+    def test_sync_call_is_not_allowed__interpreted(self):
+        # threads, subtree_cache and scheduled validate without the compiled plan
+        from gardrail import collection, subrail, convert
+
+        class Item(Gardrail):
+            @single("x")
+            async def never(self, x):
+                return NG("never")
+
+        class Cached(Item):
+            subtree_cache = 16
+
+        class Scheduled(Item):
+            scheduled = True
+
+        class Threaded(Gardrail):
+            @collection
+            class items:
+                threads = 2
+                never = Item.never
+
+        class Nested(Gardrail):
+            item = subrail("item")(Cached)
+
+        class Converted(Gardrail):
+            @convert(["x"])
+            async def never(self, params):
+                pass
+
+        cases = [(Threaded(), {"items": [{"x": 1}, {"x": 2}]}), (Nested(), {"item": {"x": 1}}),
+                 (Scheduled(), {"x": 1}), (Converted(), {"x": 1})]
+        for target, params in cases:
+            with self.assertRaises(TypeError):
+                target(params)
+
+    def test_batched(self):
+        from gardrail import Failure, collection
+
+        class G(Gardrail):
+            @collection
+            class users:
+                @single("email", batched=True)
+                def email_check(self, emails):
+                    return {i: NG("already registered") for i, email in enumerate(emails) if email == "foo"}
+
+        with self.assertRaises(Failure) as e:
+            self._run(G(), {"users": [{"email": "a"}, {"email": "foo"}]})
+        self.assertEqual(e.exception.errors, {"users": {1: {"email": ["already registered"]}}})
+
+    def test_dispatch_on(self):
+        from gardrail import Failure, dispatch_on
+
+        class Name(Gardrail):
+            @single("name")
+            async def exists(self, name):
+                if name != "red":
+                    return NG("not found")
+
+        class G(Gardrail):
+            kind = dispatch_on("kind", {"name": Name})
+
+        with self.assertRaises(Failure) as e:
+            self._run(G(), {"kind": "name", "name": "purple"})
+        self.assertEqual(e.exception.errors, {"name": ["not found"]})
+        for kind in ["rgb", ["name"]]:
+            with self.assertRaises(Failure) as e:
+                self._run(G(), {"kind": kind})
+            self.assertEqual(list(e.exception.errors), ["kind"])
+
+    def test_scheduled__skipped_after_errors(self):
+        from gardrail import Failure
+        log = []
+
+        class G(Gardrail):
+            scheduled = True
+
+            @single("email")
+            def email_format(self, email):
+                if "@" not in email:
+                    return NG("invalid")
+
+            @single("email")
+            async def email_exists(self, email):
+                log.append(email)
+                if email == "foo@example.com":
+                    return NG("already registered")
+
+        with self.assertRaises(Failure) as e:
+            self._run(G(), {"email": "foo"})
+        self.assertEqual(e.exception.errors, {"email": ["invalid"]})
+        self.assertEqual(log, [])
+        with self.assertRaises(Failure) as e:
+            self._run(G(), {"email": "foo@example.com"})
+        self.assertEqual(e.exception.errors, {"email": ["already registered"]})
+
+    def test_errors_in_definition_order(self):
+        # as the sync path, errors of nested levels are merged in order, under the error budget
+        from gardrail import Failure, container, collection
+
+        class G(Gardrail):
+            @single("a")
+            def a_check(self, a):
+                if a < 0:
+                    return NG("a")
+
+            @container
+            class c:
+                @single("x")
+                def x_check(self, x):
+                    if x < 0:
+                        return NG("cx")
+
+            @collection
+            class points:
+                @single("x")
+                def x_check(self, x):
+                    if x < 0:
+                        return NG("px")
+
+            @single("b")
+            def b_check(self, b):
+                if b < 0:
+                    return NG("b")
+
+        params = {"a": -1, "c": {"x": -1}, "points": [{"x": 1}, {"x": -1}], "b": -1}
+        for max_errors in [None, 1, 2, 3]:
+            with self.assertRaises(Failure) as sync:
+                G()(params, max_errors=max_errors)
+            with self.assertRaises(Failure) as e:
+                self._run(G(), params, max_errors=max_errors)
+            self.assertEqual(list(e.exception.args[0].flat()), list(sync.exception.args[0].flat()))
+        self.assertEqual(e.exception.errors, {"a": ["a"], "c": {"x": ["cx"]}, "points": {1: {"x": ["px"]}}})
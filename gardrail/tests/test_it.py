@@ -1,7 +1,7 @@
 # -*- coding:utf-8 -*-
 import unittest
 from evilunit import test_target
-from gardrail import Gardrail
+from gardrail import Gardrail, NG, single
 from gardrail.compat import assert_regex
 
 @test_target("gardrail:multi")
@@ -267,3 +267,1709 @@ class ConvertTests(unittest.TestCase):
         with self.assertRaises(Failure) as e:
             target(params)
         assert_regex(self, e.exception.errors["total"][0], "fields:\['x', 'y'\] not found")
+
+
+@test_target("gardrail:Gardrail")
+class TraversalTests(unittest.TestCase):
+    def _makeBalanced(self):
+        from gardrail import multi, dispatch
+
+        class Balanced(self._getTarget()):
+            @multi(["min", "max"])
+            def balanced(self, min, max):
+                if min > max:
+                    return NG("not {} < {}".format(min, max))
+
+            @dispatch()
+            def rec(self, check, params):
+                for i, child in enumerate(params.get("children", ())):
+                    check(self, child, path=["children", i])
+        return Balanced()
+
+    def _deep(self, depth, leaf):
+        params = leaf
+        for i in range(depth):
+            params = {"min": 1, "max": 2, "children": [params]}
+        return params
+
+    def test_deep_dispatch(self):
+        import sys
+        from gardrail import Failure
+        depth = sys.getrecursionlimit() * 2
+        target = self._makeBalanced()
+        with self.assertRaises(Failure) as c:
+            target(self._deep(depth, {"min": 10, "max": 1}))
+        errors = list(target.iter_errors(self._deep(depth, {"min": 10, "max": 1})))
+        self.assertEqual(errors, [(("children", 0) * depth + ("min", ), "not 10 < 1")])
+        self.assertTrue(c.exception.errors)
+
+    def test_order_of_siblings(self):
+        target = self._makeBalanced()
+        params = {"min": 1, "max": 2, "children": [{"min": 2, "max": 1, "children": [{"min": 3, "max": 1}]},
+                                                   {"min": 4, "max": 1}]}
+        self.assertEqual([path for path, _ in target.iter_errors(params)],
+                         [("children", 0, "min"), ("children", 0, "children", 0, "min"), ("children", 1, "min")])
+        self.assertEqual([path for path, _ in target.iter_errors(params, max_errors=2)],
+                         [("children", 0, "min"), ("children", 0, "children", 0, "min")])
+
+    def test_order_in_the_middle_of_a_level(self):
+        from gardrail import Failure, convert, dispatch
+
+        class Leaf(self._getTarget()):
+            @single("v")
+            def converted(self, v):
+                if not isinstance(v, int):
+                    return NG("not converted: {!r}".format(v))
+
+        class Mid(self._getTarget()):
+            @dispatch()
+            def leaf(self, check, params):
+                check(Leaf(), params)
+
+            @convert(["v"])
+            def to_int(self, params):
+                params["v"] = int(params["v"])
+
+        class Outer(self._getTarget()):
+            @dispatch()
+            def mid(self, check, params):
+                check(Mid(), params["mid"], "mid")
+
+        with self.assertRaises(Failure) as c:
+            Mid()({"v": "1"})
+        self.assertEqual(c.exception.errors, {"v": ["not converted: '1'"]})
+        with self.assertRaises(Failure) as c:
+            Outer()({"mid": {"v": "1"}})
+        self.assertEqual(c.exception.errors, {"mid": {"v": ["not converted: '1'"]}})
+
+    def test_order_of_recursive_subrail_in_the_middle_of_a_level(self):
+        from gardrail import subrail
+
+        class Tree(self._getTarget()):
+            pass
+        Tree.child = subrail("child")(Tree)
+
+        @single("v")
+        def positive(self, v):
+            if v < 0:
+                return NG("negative")
+        Tree.positive = positive  # validated after child
+
+        params = {"v": -1, "child": {"v": -2, "child": {"v": -3}}}
+        self.assertEqual([path for path, _ in Tree().iter_errors(params)],
+                         [("child", "child", "v"), ("child", "v"), ("v", )])
+        self.assertEqual([path for path, _ in Tree().iter_errors(params, max_errors=1)], [("child", "child", "v")])
+
+    def test_deep_subrail(self):
+        import sys
+        from gardrail import subrail
+
+        class Tree(self._getTarget()):
+            @single("v")
+            def positive(self, v):
+                if v < 0:
+                    return NG("negative")
+        Tree.child = subrail("child")(Tree)
+
+        depth = sys.getrecursionlimit() * 2
+        params = {"v": -1}
+        for i in range(depth):
+            params = {"v": 1, "child": params}
+        self.assertEqual(list(Tree().iter_errors(params)), [(("child", ) * depth + ("v", ), "negative")])
+
+
+@test_target("gardrail:dispatch_on")
+class DispatchOnTests(unittest.TestCase):
+    def _makeRail(self, **kwargs):
+        from gardrail import Gardrail
+
+        class ColorName(Gardrail):
+            def __init__(self):
+                raise AssertionError("not instantiated")
+
+            @single("name", strict=True)
+            def name(self, name):
+                if name not in ["red", "blue", "green"]:
+                    return NG("invalid color: {}".format(name))
+
+        class ColorTriple(Gardrail):
+            @single("r", strict=True)
+            def r(self, value):
+                if not (0 <= value <= 255):
+                    return NG("invalid color: {}".format(value))
+
+        deco = self._getTarget()
+
+        class Color(Gardrail):
+            mode = deco("mode", {"name": ColorName, "tri": ColorTriple}, **kwargs)
+
+            def on_missing(self, names, wrapname, fn):
+                return NG("missing: {}".format(fn))
+
+            def on_unknown(self, names, wrapname, value):
+                return NG("unknown: {}".format(value))
+        return Color()
+
+    def _errors(self, rail, params):
+        from gardrail import Failure
+        try:
+            rail(params)
+        except Failure as e:
+            return e.errors
+
+    def test_it(self):
+        target = self._makeRail()
+        self.assertIsNone(self._errors(target, {"mode": "name", "name": "red"}))
+        self.assertEqual(self._errors(target, {"mode": "name", "name": "purple"}), {"name": ["invalid color: purple"]})
+        self.assertEqual(self._errors(target, {"mode": "tri", "r": 300}), {"r": ["invalid color: 300"]})
+        self.assertEqual(list(self._errors(target, {"mode": "tri", "name": "red"})), ["r"])
+        self.assertEqual(self._errors(target, {"mode": "hsv"}), {"mode": ["unknown: hsv"]})
+        self.assertIsNone(self._errors(target, {}))
+
+    def test_strict(self):
+        target = self._makeRail(strict=True)
+        self.assertEqual(self._errors(target, {}), {"mode": ["missing: mode"]})
+
+    def test_unknown(self):
+        from gardrail import Gardrail
+        deco = self._getTarget()
+
+        class Color(Gardrail):
+            mode = deco("mode", {"name": Gardrail})
+
+        class Interpreted(Color):
+            scheduled = True
+
+        for value in ["hsv", ["name"], {"name": 1}]:
+            expected = {"mode": ["fields:['mode'] unknown value: {!r} (DispatchOn)".format(value)]}
+            self.assertEqual(self._errors(Color(), {"mode": value}), expected)
+            self.assertEqual(self._errors(Interpreted(), {"mode": value}), expected)
+
+    def test_decorated(self):
+        from gardrail import Gardrail
+        deco = self._getTarget()
+
+        class Positive(Gardrail):
+            @single("value")
+            def positive(self, value):
+                if value < self.minimum:
+                    return NG("too small")
+
+        class Event(Gardrail):
+            minimum = 0
+
+            @deco("type", {"number": Positive})
+            def kind(self, type):
+                return type.lower()
+
+        self.assertEqual(self._errors(Event(), {"type": "NUMBER", "value": -1}), {"value": ["too small"]})
+        self.assertIsNone(self._errors(Event(), {"type": "Number", "value": 1}))
+
+
+@test_target("gardrail:compile_plan")
+class CompilePlanTests(unittest.TestCase):
+    def _callFUT(self, cls):
+        return self._getTarget()(cls)
+
+    def _makeRail(self):
+        from gardrail import multi, single, subrail, container, collection, NG
+
+        class PositivePoint(Gardrail):
+            @multi(["x", "y"])
+            def positive(self, x, y):
+                if not (x > 0 and y > 0):
+                    return NG("oops")
+
+        class G(Gardrail):
+            left = subrail("left")(PositivePoint)
+
+            @container
+            class right:
+                @single("x")
+                def positive(self, x):
+                    if x <= 0:
+                        return NG("right")
+
+            @collection
+            class points:
+                @multi(["x", "y"], path="x")
+                def equals(self, x, y):
+                    if x != y:
+                        return NG("points")
+        return PositivePoint, G
+
+    def test_it__cached(self):
+        _, G = self._makeRail()
+        self.assertIs(self._callFUT(G), self._callFUT(G))
+
+    def test_it__same_errors_as_interpretation(self):
+        from gardrail import Failure
+        _, G = self._makeRail()
+
+        class Interpreted(G):
+            def validate_context(self, context):
+                for v in self.validators:
+                    v.validate_context(context)
+
+        params = {"left": {"x": -1, "y": 10}, "right": {"x": -1},
+                  "points": [{"x": 1, "y": 1}, {"x": 1, "y": 2}]}
+        with self.assertRaises(Failure) as expected:
+            Interpreted()(params)
+        with self.assertRaises(Failure) as e:
+            G()(params)
+        self.assertEqual(e.exception.errors, expected.exception.errors)
+        self.assertEqual(e.exception.errors, {"left": {"x": ["oops"]}, "right": {"x": ["right"]},
+                                              "points": {1: {"x": ["points"]}}})
+
+    def test_it__scope_is_outermost(self):
+        from gardrail import dispatch, single
+        scopes = []
+
+        class Child(Gardrail):
+            @single("v")
+            def check(self, v):
+                scopes.append(self)
+
+        class Parent(Gardrail):
+            @dispatch()
+            def rec(self, check, params):
+                check(Child(), params)
+
+        target = Parent()
+        target({"v": 1})
+        self.assertEqual(scopes, [target])
+
+    def test_it__fields_are_looked_up_once_per_level(self):
+        from gardrail import multi, matched, convert
+
+        class Params(dict):
+            looked_up = []
+
+            def get(self, k, default=None):
+                self.looked_up.append(k)
+                return super(Params, self).get(k, default)
+
+        class G(Gardrail):
+            @multi(["x", "y"])
+            def a(self, x, y):
+                pass
+
+            @matched(["x", "y", "z"], path="__all__")
+            def b(self, values):
+                pass
+
+            @convert(["x"])
+            def c(self, params):
+                params["x"] = params["x"] + 1
+
+            @single("x")
+            def d(self, x):
+                if x != 2:
+                    return NG("not converted")
+
+        G()(Params({"x": 1, "y": 1}))
+        self.assertEqual(Params.looked_up, ["x", "y", "z", "x"])
+
+    def test_it__rebuilt_if_class_is_changed(self):
+        from gardrail import Failure, single, NG
+        _, G = self._makeRail()
+        plan = self._callFUT(G)
+        G.z_is_positive = single("z")(lambda self, z: NG("z") if z < 0 else None)
+        self.assertIsNot(self._callFUT(G), plan)
+        with self.assertRaises(Failure) as e:
+            G()({"z": -1})
+        self.assertEqual(e.exception.errors, {"z": ["z"]})
+
+    def test_it__rebuilt_if_inlined_subrail_is_changed(self):
+        from gardrail import Failure, single, NG
+        PositivePoint, G = self._makeRail()
+        G()({"left": {"x": 1, "y": 1, "z": -1}})
+        PositivePoint.z_is_positive = single("z")(lambda self, z: NG("z") if z < 0 else None)
+        with self.assertRaises(Failure) as e:
+            G()({"left": {"x": 1, "y": 1, "z": -1}})
+        self.assertEqual(e.exception.errors, {"left": {"z": ["z"]}})
+
+    def test_it__shared_by_classes_having_same_validators(self):
+        from gardrail import Failure, single, NG
+        PositivePoint, G = self._makeRail()
+        Tenant = type("Tenant", (G, ), {"max_errors": 3})
+        self.assertIsNone(Tenant.__dict__.get("_validators"))  # collected at the first use
+        self.assertIs(self._callFUT(Tenant), self._callFUT(G))
+
+        PositivePoint.z_is_positive = single("z")(lambda self, z: NG("z") if z < 0 else None)
+        self.assertIsNone(Tenant._plan)
+        with self.assertRaises(Failure) as e:
+            Tenant()({"left": {"x": 1, "y": 1, "z": -1}})
+        self.assertEqual(e.exception.errors, {"left": {"z": ["z"]}})
+
+
+@test_target("gardrail:Gardrail.validate_many")
+class ValidateManyTests(unittest.TestCase):
+    def _makeOne(self):
+        from gardrail import NG, multi
+
+        class G(Gardrail):
+            @multi(["x", "y"], strict=True)
+            def positive(self, x, y):
+                if not (x > 0 and y > 0):
+                    return NG("oops")
+
+            def configure_many(self, obs):
+                self.batches = getattr(self, "batches", []) + [len(obs)]
+                return super(G, self).configure_many(obs)
+        return G()
+
+    def test_it(self):
+        target = self._makeOne()
+        records = [{"x": 10, "y": 10}, {"x": -10, "y": 10}, {"x": 1, "y": 1}, {"x": 1, "y": -1}]
+        result = list(target.validate_many(iter(records), batch_size=3))
+        self.assertEqual([r.index for r in result], [0, 1, 2, 3])
+        self.assertEqual([r.ok for r in result], [True, False, True, False])
+        self.assertEqual(result[0].params, {"x": 10, "y": 10})
+        self.assertEqual(result[1].errors, {"x": ["oops"]})
+        self.assertEqual(result[3].errors, {"x": ["oops"]})
+        self.assertIsNot(result[1].errors, result[3].errors)
+        self.assertEqual(target.batches, [3, 1])
+
+    def test_it__lazy(self):
+        import itertools
+        target = self._makeOne()
+        records = itertools.cycle([{"x": 10, "y": 10}, {}])
+        result = list(itertools.islice(target.validate_many(records, batch_size=10), 5))
+        self.assertEqual([r.ok for r in result], [True, False, True, False, True])
+
+
+class _Registration(Gardrail):
+    # module level, for sending it to worker processes
+    def __init__(self, emails):
+        import threading
+        self.emails = emails
+        self.lock = threading.Lock()  # unpicklable
+
+    def __reduce__(self):
+        return (self.__class__, (self.emails, ))
+
+    @single("email")
+    def email_check(self, email):
+        if email in self.emails:
+            return NG("already registered")
+
+
+class _NamedRegistration(_Registration):
+    @single("name", strict=True)
+    def name_check(self, name):
+        if not name:
+            return NG("empty")
+
+
+@test_target("gardrail:Gardrail.validate_many")
+class ValidateManyParallelTests(unittest.TestCase):
+    def test_it(self):
+        target = _Registration(["foo@example.com"])
+        records = [{"email": "{}@example.com".format(name)} for name in ["a", "foo", "b", "c", "foo"]]
+        result = list(target.validate_many(records, workers=2, chunksize=2))
+        self.assertEqual([r.index for r in result], [0, 1, 2, 3, 4])
+        self.assertEqual([r.ok for r in result], [True, False, True, True, False])
+        self.assertEqual(result[1].errors, {"email": ["already registered"]})
+        self.assertEqual(result[2].params, {"email": "b@example.com"})
+
+    def test_strict_missing_field(self):
+        target = _NamedRegistration(["foo@example.com"])
+        result = list(target.validate_many([{"email": "a@example.com", "name": "a"}, {}], workers=2))
+        self.assertEqual([r.ok for r in result], [True, False])
+        assert_regex(self, result[1].errors["name"][0], r"fields:\['name'\] not found")
+
+    def test_unpicklable(self):
+        class Local(Gardrail):
+            pass
+        with self.assertRaises(TypeError):
+            list(Local().validate_many([{}], workers=2))
+
+
+@test_target("gardrail:single")
+class BatchedTests(unittest.TestCase):
+    def _makeOne(self, calls):
+        from gardrail import collection
+        deco = self._getTarget()
+
+        class G(Gardrail):
+            @deco("email", batched=True)
+            def email_check(self, emails):
+                calls.append(emails)
+                return {i: NG("already registered") for i, email in enumerate(emails) if email.startswith("foo")}
+
+            @collection
+            class users:
+                @deco("email", batched=True, strict=True)
+                def email_check(self, emails):
+                    calls.append(emails)
+                    return [NG("already registered") if email.startswith("foo") else None for email in emails]
+        return G()
+
+    def test_collection(self):
+        from gardrail import Failure
+        calls = []
+        target = self._makeOne(calls)
+        params = {"users": [{"email": "a"}, {"email": "foo"}, {}, {"email": "b"}, {"email": "foo"}]}
+        with self.assertRaises(Failure) as e:
+            target(params)
+        self.assertEqual(calls, [["a", "foo", "b", "foo"]])
+        self.assertEqual(e.exception.errors["users"][1], {"email": ["already registered"]})
+        self.assertEqual(e.exception.errors["users"][4], {"email": ["already registered"]})
+        assert_regex(self, e.exception.errors["users"][2]["email"][0], "fields:\['email'\] not found")
+
+    def test_validate_many(self):
+        calls = []
+        target = self._makeOne(calls)
+        records = [{"email": "a"}, {"email": "foo"}, {}, {"email": "b"}, {"email": "foo"}]
+        result = list(target.validate_many(records, batch_size=3))
+        self.assertEqual(calls, [["a", "foo"], ["b", "foo"]])
+        self.assertEqual([r.ok for r in result], [True, False, True, True, False])
+        self.assertEqual(result[4].errors, {"email": ["already registered"]})
+
+    def test_single_record(self):
+        from gardrail import Failure
+        calls = []
+        target = self._makeOne(calls)
+        with self.assertRaises(Failure) as e:
+            target({"email": "foo"})
+        self.assertEqual(calls, [["foo"]])
+        self.assertEqual(e.exception.errors, {"email": ["already registered"]})
+
+
+@test_target("gardrail:vectorized")
+class VectorizedTests(unittest.TestCase):
+    def _makeOne(self):
+        from gardrail import collection
+        deco = self._getTarget()
+
+        class G(Gardrail):
+            @collection
+            class points:
+                @deco(["x", "y", "z"], "negative", path="__all__")
+                def positive(self, x, y, z):
+                    return (x < 0) | (y < 0) | (z < 0)
+        return G()
+
+    def test_success(self):
+        params = {"points": [{"x": 10, "y": 10, "z": 10}] * 3}
+        self.assertEqual(self._makeOne()(params), params)
+
+    def test_failure(self):
+        from gardrail import Failure
+        params = {"points": [{"x": 10, "y": 10, "z": 10}, {"x": 10, "y": -10, "z": 10}, {"x": 10}, {"x": 1, "y": 1, "z": -1}]}
+        with self.assertRaises(Failure) as e:
+            self._makeOne()(params)
+        self.assertEqual(e.exception.errors, {"points": {1: {"__all__": ["negative"]}, 3: {"__all__": ["negative"]}}})
+
+    def test_failure__numpy_is_not_installed(self):
+        from gardrail import Failure
+        import gardrail
+        original, gardrail.numpy = gardrail.numpy, None
+        try:
+            with self.assertRaises(Failure) as e:
+                self._makeOne()({"points": [{"x": 10, "y": 10, "z": 10}, {"x": 10, "y": -10, "z": 10}]})
+        finally:
+            gardrail.numpy = original
+        self.assertEqual(e.exception.errors, {"points": {1: {"__all__": ["negative"]}}})
+
+
+@test_target("gardrail:Gardrail.iter_errors")
+class ErrorBudgetTests(unittest.TestCase):
+    def _makeOne(self, calls):
+        from gardrail import collection, container
+
+        class G(Gardrail):
+            @collection
+            class points:
+                @single("x")
+                def positive(self, x):
+                    calls.append(x)
+                    if x < 0:
+                        return NG("negative")
+
+            @container
+            class center:
+                @single("x")
+                def positive(self, x):
+                    calls.append(x)
+                    if x < 0:
+                        return NG("negative")
+        return G()
+
+    def _params(self):
+        return {"points": [{"x": 1}, {"x": -1}, {"x": -2}, {"x": -3}], "center": {"x": -4}}
+
+    def test_iter_errors(self):
+        target = self._makeOne([])
+        result = list(target.iter_errors(self._params()))
+        self.assertEqual(result, [(("points", 1, "x"), "negative"), (("points", 2, "x"), "negative"),
+                                  (("points", 3, "x"), "negative"), (("center", "x"), "negative")])
+
+    def test_iter_errors__max_errors(self):
+        calls = []
+        target = self._makeOne(calls)
+        result = list(target.iter_errors(self._params(), max_errors=2))
+        self.assertEqual(result, [(("points", 1, "x"), "negative"), (("points", 2, "x"), "negative")])
+        self.assertEqual(calls, [1, -1, -2])
+
+    def test_max_errors__less_than_1(self):
+        target = self._makeOne([])
+        for max_errors in (0, -1):
+            with self.assertRaises(ValueError):
+                list(target.iter_errors(self._params(), max_errors=max_errors))
+            with self.assertRaises(ValueError):
+                target(self._params(), max_errors=max_errors)
+
+    def test_fail_fast(self):
+        from gardrail import Failure
+        calls = []
+        target = self._makeOne(calls)
+        with self.assertRaises(Failure) as e:
+            target(self._params(), fail_fast=True)
+        self.assertEqual(e.exception.errors, {"points": {1: {"x": ["negative"]}}})
+        self.assertEqual(calls, [1, -1])
+
+    def test_interrupt(self):
+        from gardrail import Failure, Interrupt, Context, Errors, _Status
+
+        class G(Gardrail):
+            @single("x")
+            def positive(self, x):
+                if x < 0:
+                    return Interrupt("negative")
+
+            @single("y")
+            def never_called(self, y):
+                raise AssertionError("not reached")
+
+        params = {"x": -1, "y": 1}
+        with self.assertRaises(Failure) as e:
+            G()(params)
+        self.assertEqual(e.exception.errors, {"x": ["negative"]})
+
+        context = Context(ob=params, scope=G(), status=_Status(True), params=params, errors=Errors(), path=[])
+        G().validate_context(context)
+        self.assertEqual((context.params, context.path), (params, []))
+
+
+@test_target("gardrail:Memo")
+class MemoTests(unittest.TestCase):
+    def _makeOne(self, calls, **options):
+        from gardrail import collection, matched, share
+
+        class G(Gardrail):
+            @collection
+            class colors:
+                @single("name", **options)
+                def name(self, name):
+                    calls.append(name)
+                    if name not in ["red", "blue", "green"]:
+                        return NG("invalid color: {}".format(name))
+
+                @share(single("r"), single("g"), single("b"), **options)
+                def range(self, value):
+                    calls.append(value)
+                    if not (0 <= value <= 255):
+                        return NG("invalid color: {}".format(value))
+
+                @matched(["r", "g", "b"], path="__all__", **options)
+                def bright(self, values):
+                    calls.append(tuple(values))
+        return G
+
+    def test_it(self):
+        from gardrail import Failure
+        calls = []
+        G = self._makeOne(calls, pure=True)
+        params = {"colors": [{"name": "red", "r": 0, "g": 0, "b": 300}] * 3}
+        with self.assertRaises(Failure) as e:
+            G()(params)
+        self.assertEqual(calls, ["red", 0, 300, (0, 0, 300)])
+        self.assertEqual(e.exception.errors["colors"][2], {"b": ["invalid color: 300"]})
+        self.assertEqual(G.colors.cls.name.method.cache_info(), (2, 1, 0, 128, 1))
+        self.assertEqual(G.colors.cls.range[0].method.cache_info(), (7, 2, 0, 128, 2))
+
+    def test_typed(self):
+        # 1 == True, but they are cached apart
+        from gardrail import Failure, matched
+
+        def make():
+            class Flags(Gardrail):
+                @single("flag", pure=True)
+                def flag(self, flag):
+                    if not isinstance(flag, bool):
+                        return NG("not bool")
+
+                @matched(["a"], path="a", pure=True)
+                def a(self, values):
+                    if isinstance(values[0], bool):
+                        return NG("bool")
+            return Flags()
+
+        def errors(rail, value):
+            try:
+                rail({"flag": value, "a": value})
+            except Failure as e:
+                return e.errors
+
+        for values in [(1, True), (True, 1)]:
+            rail = make()
+            self.assertEqual([errors(rail, v) for v in values],
+                             [{"flag": ["not bool"]} if v is not True else {"a": ["bool"]} for v in values])
+
+    def test_eviction(self):
+        calls = []
+        G = self._makeOne(calls, cache=2)
+        G()({"colors": [{"name": "red"}, {"name": "blue"}, {"name": "green"}, {"name": "red"}]})
+        self.assertEqual(calls, ["red", "blue", "green", "red"])
+        self.assertEqual(G.colors.cls.name.method.cache_info(), (0, 4, 2, 2, 2))
+
+    def test_unhashable(self):
+        from gardrail import Failure
+        calls = []
+        G = self._makeOne(calls, pure=True)
+        with self.assertRaises(Failure):
+            G()({"colors": [{"name": ["red"]}, {"name": ["red"]}]})
+        self.assertEqual(calls, [["red"], ["red"]])
+
+
+@test_target("gardrail:Errors")
+class ErrorsTests(unittest.TestCase):
+    def test_it(self):
+        target = self._makeOne()
+        target.add(("points", 1, "x"), "negative")
+        target.add(("points", 1, "x"), "oops")
+        target.add(("points", 2, "y"), "negative")
+        target.add(("__all__", ), "oops")
+        self.assertTrue(target)
+        self.assertIsNone(target.tree)
+        self.assertEqual(target, {"points": {1: {"x": ["negative", "oops"]}, 2: {"y": ["negative"]}},
+                                  "__all__": ["oops"]})
+        self.assertEqual(list(target.flat())[0], (("points", 1, "x"), "negative"))
+
+    def test_message_is_formatted_lazily(self):
+        from gardrail import Message
+        formatted = []
+
+        class Name(object):
+            def __format__(self, spec):
+                formatted.append(spec)
+                return "name"
+
+        target = self._makeOne()
+        target.add(("x", ), Message("fields:{} not found", Name()))
+        self.assertEqual(formatted, [])
+        self.assertEqual(target["x"], ["fields:name not found"])
+        self.assertEqual(formatted, [""])
+
+    def test_failure_errors_is_dict(self):
+        from gardrail import Failure
+        target = self._makeOne()
+        target.add(("x", ), "oops")
+        self.assertEqual(type(Failure(target).errors), dict)
+        self.assertEqual(repr(Failure(target)), "Failure[{'x': ['oops']}]")
+
+
+    def test_convert_is_not_cached(self):
+        from gardrail import convert, collection, container
+
+        class Order(Gardrail):
+            @collection
+            class items:
+                subtree_cache = 16
+
+                @convert(["qty"], path="qty")
+                def to_int(self, params):
+                    params["qty"] = int(params["qty"])
+
+            @container
+            class note:
+                subtree_cache = 16
+
+                @container
+                class body:  # nested
+                    @convert(["text"], path="text")
+                    def strip(self, params):
+                        params["text"] = params["text"].strip()
+
+        for _ in range(2):
+            result = Order()({"items": [{"qty": "1"}, {"qty": "1"}], "note": {"body": {"text": " a "}}})
+            self.assertEqual(result, {"items": [{"qty": 1}, {"qty": 1}], "note": {"body": {"text": "a"}}})
+        self.assertEqual(Order.items.subtrees.cache_info().currsize, 0)
+
+@test_target("gardrail:CompactErrors")
+class CompactErrorsTests(unittest.TestCase):
+    def test_it(self):
+        target = self._makeOne(cap=2, samples=2)
+        for i in range(10):
+            target.add(("points", i, "x"), "negative")
+        for i in [1, 2, 5, 6, 8]:
+            target.add(("points", i, "y"), "oops")
+        target.add(("__all__", ), "oops")
+        self.assertTrue(target)
+        self.assertEqual(target.count, 16)
+        self.assertEqual(target.summary(), [
+            {"path": ("points", "*", "x"), "message": "negative", "count": 10, "ranges": [((), 0, 10)],
+             "samples": [(0, ), (1, )], "truncated": False},
+            {"path": ("points", "*", "y"), "message": "oops", "count": 5, "ranges": [((), 1, 3), ((), 5, 7)],
+             "samples": [(1, ), (2, )], "truncated": True},
+            {"path": ("__all__", ), "message": "oops", "count": 1, "ranges": [], "samples": [()], "truncated": False},
+        ])
+        self.assertEqual(target["points"][9], {"x": ["negative"]})
+        self.assertEqual(target["points"][6], {"x": ["negative"], "y": ["oops"]})
+        self.assertEqual(target["points"][8], {"x": ["negative"]})  # "oops" is over the cap
+
+    def test_nested_collections(self):
+        target = self._makeOne()
+        for i in range(3):
+            for j in range(2):
+                target.add(("rows", i, "cells", j), "empty")
+        self.assertEqual(target.summary()[0]["ranges"], [((0, ), 0, 2), ((1, ), 0, 2), ((2, ), 0, 2)])
+        self.assertEqual(list(target.flat())[:3], [(("rows", 0, "cells", 0), "empty"), (("rows", 0, "cells", 1), "empty"),
+                                                   (("rows", 1, "cells", 0), "empty")])
+
+    def test_compact_errors_option(self):
+        from gardrail import Failure, Errors, collection
+
+        class PointList(Gardrail):
+            compact_errors = {"cap": 10, "samples": 3}
+
+            @collection
+            class points:
+                @single("x")
+                def positive(self, x):
+                    if x < 0:
+                        return NG("negative")
+
+        params = {"points": [{"x": -1}] * 1000 + [{"x": 1}, {"x": -1}]}
+        with self.assertRaises(Failure) as c:
+            PointList()(params)
+        errors = c.exception.args[0]
+        self.assertEqual(len(errors.groups), 1)
+        self.assertEqual(errors.count, 1001)
+        self.assertEqual(c.exception.summary()[0]["ranges"], [((), 0, 1000), ((), 1001, 1002)])
+        self.assertEqual(len(c.exception.errors["points"]), 1001)
+
+        # same as Errors
+        PointList.compact_errors = None
+        with self.assertRaises(Failure) as c2:
+            PointList()(params)
+        self.assertIsInstance(c2.exception.args[0], Errors)
+        self.assertEqual(c2.exception.errors, c.exception.errors)
+        self.assertEqual(c2.exception.args[0].compact(cap=10, samples=3).summary(), c.exception.summary())
+
+
+@test_target("gardrail:Gardrail")
+class RevalidateTests(unittest.TestCase):
+    def _makeRail(self, calls):
+        from gardrail import multi, convert, collection
+
+        class G(self._getTarget()):
+            @single("name")
+            def name_check(self, name):
+                calls.append("name")
+                if not name:
+                    return NG("empty")
+
+            @multi(["password", "re-password"])
+            def password_check(self, password, re_password):
+                calls.append("password")
+                if password != re_password:
+                    return NG("not same")
+
+            @convert(["x", "y"], path="total")
+            def total(self, params):
+                calls.append("total")
+                params["total"] = params["x"] + params["y"]
+
+            @single("total")
+            def total_check(self, total):
+                calls.append("total_check")
+                if total < 0:
+                    return NG("negative")
+
+            @collection
+            class points:
+                @single("x")
+                def positive(self, x):
+                    calls.append("points.x")
+                    if x < 0:
+                        return NG("negative")
+
+        return G()
+
+    def _params(self, **kwargs):
+        params = {"name": "", "password": "a", "re-password": "b", "x": 1, "y": 1,
+                  "points": [{"x": -1}, {"x": 1}]}
+        params.update(kwargs)
+        return params
+
+    def _errors(self, target, params, **kwargs):
+        from gardrail import Failure
+        try:
+            target.revalidate(params, **kwargs)
+        except Failure as e:
+            return e.errors
+        return {}
+
+    def test_only_changed_fields_are_validated(self):
+        from gardrail import Failure
+        calls = []
+        target = self._makeRail(calls)
+        with self.assertRaises(Failure) as c:
+            target(self._params())
+        previous = c.exception.errors
+        self.assertEqual(previous, {"name": ["empty"], "password": ["not same"], "points": {0: {"x": ["negative"]}}})
+
+        calls[:] = []
+        errors = self._errors(target, self._params(password="b"), changed=["password"], previous_errors=previous)
+        self.assertEqual(calls, ["password"])
+        self.assertEqual(errors, {"name": ["empty"], "points": {0: {"x": ["negative"]}}})
+
+    def test_converted_fields_are_validated_again(self):
+        calls = []
+        target = self._makeRail(calls)
+        errors = self._errors(target, self._params(x=-3), changed=["x"], previous_errors={})
+        self.assertEqual(calls, ["total", "total_check"])
+        self.assertEqual(errors, {"total": ["negative"]})
+
+    def test_converted_fields_are_validated_again__list_path(self):
+        from gardrail import convert
+        calls = []
+
+        class G(self._getTarget()):
+            @convert(["a"], path=["a"])
+            def to_int(self, params):
+                calls.append("to_int")
+                params["a"] = int(params["a"])
+
+            @single("a")
+            def positive(self, a):
+                calls.append("positive")
+                if a < 0:
+                    return NG("negative")
+
+        errors = self._errors(G(), {"a": "-1", "b": 1}, changed=["a"], previous_errors={})
+        self.assertEqual(calls, ["to_int", "positive"])
+        self.assertEqual(errors, {"a": ["negative"]})
+
+    def test_nested_path(self):
+        calls = []
+        target = self._makeRail(calls)
+        previous = {"points": {0: {"x": ["negative"]}, 1: {"x": ["negative"]}}}
+        errors = self._errors(target, self._params(), changed=[("points", 1, "x")], previous_errors=previous)
+        self.assertEqual(calls, ["points.x"])
+        self.assertEqual(errors, {"points": {0: {"x": ["negative"]}}})
+
+    def test_validate_only(self):
+        from gardrail import Failure
+        calls = []
+        target = self._makeRail(calls)
+        with self.assertRaises(Failure) as c:
+            target.validate(self._params(), only=["name", "points"])
+        self.assertEqual(sorted(set(calls)), ["name", "points.x"])
+        self.assertEqual(c.exception.errors, {"name": ["empty"], "points": {0: {"x": ["negative"]}}})
+
+    def test_validate_only__error_budget(self):
+        from gardrail import Failure
+        calls = []
+        target = self._makeRail(calls)
+        with self.assertRaises(Failure) as c:
+            target.validate(self._params(), only=["name", "password"], fail_fast=True)
+        self.assertEqual(calls, ["name"])
+        self.assertEqual(c.exception.errors, {"name": ["empty"]})
+
+    def test_errors_at_other_paths(self):
+        from gardrail import Failure
+
+        class G(self._getTarget()):
+            @single("email")
+            def email_check(self, email):
+                if "@" not in email:
+                    return NG("bad email", path="contact")
+
+        with self.assertRaises(Failure) as c:
+            G()({"email": "x"})
+        previous = c.exception.errors
+        self.assertEqual(previous, {"contact": ["bad email"]})
+        self.assertEqual(self._errors(G(), {"email": "x@example.com"}, changed=["email"],
+                                      previous_errors=previous), {})
+        # from Errors, too
+        self.assertEqual(self._errors(G(), {"email": "x@example.com"}, changed=["email"],
+                                      previous_errors=c.exception.args[0]), {})
+
+
+@test_target("gardrail.instrument:Collector")
+class InstrumentTests(unittest.TestCase):
+    def _makeRail(self):
+        from gardrail import collection
+
+        class PointList(Gardrail):
+            @single("name")
+            def name_check(self, name):
+                if not name:
+                    return NG("empty")
+
+            @collection
+            class points:
+                @single("x")
+                def positive(self, x):
+                    if x < 0:
+                        return NG("negative")
+        return PointList()
+
+    def test_it(self):
+        from gardrail import Failure
+        from gardrail.instrument import Key
+        rail = self._makeRail()
+        with rail.instrument(self._makeOne()) as collector:
+            with self.assertRaises(Failure):
+                rail({"name": "", "points": [{"x": 1}, {"x": -1}, {"x": 2}]})
+            rail({"name": "b", "points": []})
+        self.assertIsNone(rail.collector)
+
+        stats = collector.stats
+        self.assertEqual(sorted(stats), [Key("PointList", "name_check", ()),
+                                         Key("PointList", "points", ()),
+                                         Key("points", "positive", ("points", ))])
+        name_check = stats[Key("PointList", "name_check", ())]
+        self.assertEqual((name_check.calls, name_check.failures), (2, 1))
+        positive = stats[Key("points", "positive", ("points", ))]
+        self.assertEqual((positive.calls, positive.failures), (3, 1))
+        self.assertGreaterEqual(positive.p99, 0)
+        self.assertIn("points.positive @points", collector.report())
+
+    def test_nested_rails(self):
+        from gardrail import dispatch, dispatch_on, subrail
+        from gardrail.instrument import Key
+
+        class Leaf(Gardrail):
+            @single("v")
+            def leafcheck(self, v):
+                if v < 0:
+                    return NG("negative")
+
+        class Tree(Gardrail):
+            kind = dispatch_on("t", {"leaf": Leaf})
+
+            @dispatch()
+            def rec(self, check, params):
+                if "leaf" in params:
+                    check(Leaf(), params["leaf"], "leaf")
+
+            @single("v")
+            def treecheck(self, v):
+                if v < 0:
+                    return NG("negative")
+        Tree.child = subrail("child")(Tree)
+
+        rail = Tree()
+        with rail.instrument(self._makeOne()) as collector:
+            rail({"v": 1, "t": "leaf", "leaf": {"v": 1}, "child": {"v": 2, "child": {"v": 3}}})
+        stats = collector.stats
+        self.assertEqual(stats[Key("Leaf", "leafcheck", ())].calls, 2)  # by dispatch_on and dispatch
+        self.assertEqual(stats[Key("Tree", "treecheck", ())].calls, 3)
+
+    def test_disabled(self):
+        rail = self._makeRail()
+        rail({"name": "a", "points": [{"x": 1}]})
+        self.assertIsNone(rail._instrumented_plan)
+        self.assertNotIn("record", rail._plan.source)
+
+
+@test_target("gardrail:Gardrail")
+class ThreadsTests(unittest.TestCase):
+    def _makeRail(self, threads, active):
+        import time
+        import threading
+        from gardrail import collection
+        lock = threading.Lock()
+
+        class Addresses(self._getTarget()):
+            @collection
+            class addresses:
+                @single("zip")
+                def zip_check(self, zip):
+                    with lock:
+                        active.append(threading.current_thread())
+                    time.sleep(0.01)  # e.g. calling a remote service
+                    if zip < 0:
+                        return NG("not found")
+            addresses.threads = threads
+        return Addresses()
+
+    def test_collection(self):
+        params = {"addresses": [{"zip": i if i % 3 else -i - 1} for i in range(10)]}
+        active = []
+        threaded = list(self._makeRail(4, active).iter_errors(params))
+        self.assertGreater(len(set(active)), 1)
+        sequential = list(self._makeRail(None, []).iter_errors(params))
+        self.assertEqual(threaded, sequential)
+        self.assertEqual([path for path, _ in threaded],
+                         [("addresses", 0, "zip"), ("addresses", 3, "zip"), ("addresses", 6, "zip"), ("addresses", 9, "zip")])
+        self.assertEqual(list(self._makeRail(4, []).iter_errors(params, max_errors=2)), sequential[:2])
+
+    def test_rail(self):
+        from gardrail import convert, Failure
+
+        class Order(self._getTarget()):
+            threads = 2
+
+            @single("price")
+            def price_check(self, price):
+                if price < 0:
+                    return NG("negative")
+
+            @single("amount")
+            def amount_check(self, amount):
+                if amount < 0:
+                    return NG("negative")
+
+            @convert(["price", "amount"], path="total")
+            def total(self, params):
+                params["total"] = params["price"] * params["amount"]
+
+            @single("total")
+            def total_check(self, total):
+                if total > 100:
+                    return NG("too much")
+
+        self.assertEqual(Order()({"price": 10, "amount": 2})["total"], 20)
+        with self.assertRaises(Failure) as c:
+            Order()({"price": -10, "amount": -20})
+        self.assertEqual(list(c.exception.errors), ["price", "amount", "total"])
+
+
+@test_target("gardrail:Gardrail")
+class ConcurrentCallsTests(unittest.TestCase):
+    """one instance is called by many threads at the same time"""
+
+    def _makeRail(self):
+        from gardrail import multi, matched, container, collection, subrail, dispatch_on
+
+        class Point(Gardrail):
+            @multi(["x", "y"], pure=True)
+            def balanced(self, x, y):
+                if x > y:
+                    return NG("x > y")
+
+        class Shape(self._getTarget()):
+            kind = dispatch_on("kind", {"point": Point})
+
+            @collection
+            class points:
+                @matched(["x", "y"], path="__all__")
+                def positive(self, values):
+                    if min(values) < 0:
+                        return NG("negative")
+
+            @container
+            class style:
+                @single("color")
+                def color(self, color):
+                    if color not in ("red", "blue"):
+                        return NG("unknown color")
+
+            origin = subrail("origin")(Point)
+        return Shape
+
+    def _params(self, i):
+        return {"kind": "point", "x": i % 5, "y": 2, "points": [{"x": j - i % 3, "y": j} for j in range(5)],
+                "style": {"color": "red" if i % 4 else "green"}, "origin": {"x": i % 7, "y": 3}}
+
+    def _results(self, rail, indices):
+        from gardrail import Failure
+        results = []
+        for i in indices:
+            try:
+                rail(self._params(i))
+                results.append((i, None))
+            except Failure as e:
+                results.append((i, e.errors))
+        return results
+
+    def test_it(self):
+        import threading
+        cls = self._makeRail()
+        expected = dict(self._results(cls(), range(64)))
+        self.assertTrue(any(expected.values()))
+        self.assertTrue(not all(expected.values()))
+
+        rail = cls()
+        start = threading.Event()
+        results = []
+
+        def worker(n):
+            start.wait()
+            results.extend(self._results(rail, [(n + k) % 64 for k in range(200)]))
+
+        def invalidating():
+            start.wait()
+            for i in range(200):
+                cls.description = i  # the plan is compiled again
+
+        threads = [threading.Thread(target=worker, args=(n, )) for n in range(8)]
+        threads.append(threading.Thread(target=invalidating))
+        for t in threads:
+            t.start()
+        start.set()
+        for t in threads:
+            t.join()
+        self.assertEqual(len(results), 8 * 200)
+        for i, errors in results:
+            self.assertEqual(errors, expected[i])
+
+
+@test_target("gardrail.schedule:Schedule")
+class ScheduleTests(unittest.TestCase):
+    def _makeRail(self, calls, threads=None):
+        from gardrail import convert, container
+
+        class Order(Gardrail):
+            scheduled = True
+
+            @single("total")
+            def total_check(self, total):  # defined before convert
+                calls.append("total_check")
+                if total > 100:
+                    return NG("too much")
+
+            @single("email")
+            def email_format(self, email):
+                calls.append("email_format")
+                if "@" not in email:
+                    return NG("invalid email")
+
+            @single("email")
+            def email_exists(self, email):
+                calls.append("email_exists")  # e.g. a query to the database
+                if email == "foo@example.com":
+                    return NG("already registered")
+
+            @single("price")
+            def price_check(self, price):
+                calls.append("price_check")
+                if price < 0:
+                    return NG("negative")
+
+            @convert(["price", "amount"], path="total")
+            def total(self, params):
+                calls.append("total")
+                params["total"] = params["price"] * params["amount"]
+
+            @container
+            class shipping:
+                scheduled = True
+
+                @single("zip")
+                def zip_format(self, zip):
+                    if len(zip) != 7:
+                        return NG("invalid zip")
+
+                @single("zip")
+                def zip_exists(self, zip):
+                    calls.append("zip_exists")
+        Order.threads = threads
+        return Order
+
+    def test_levels(self):
+        calls = []
+        Order = self._makeRail(calls)
+        from gardrail.instrument import validator_name
+        levels = [[validator_name(node.validator) for node in level] for level in Order.validators.levels]
+        self.assertEqual(levels, [["email_format", "price_check", "shipping"], ["email_exists", "total"], ["total_check"]])
+        self.assertEqual(Order()({"price": 10, "amount": 2, "email": "bar@example.com", "shipping": {"zip": "1234567"}}),
+                         {"price": 10, "amount": 2, "email": "bar@example.com", "total": 20, "shipping": {"zip": "1234567"}})
+        self.assertEqual(calls, ["email_format", "price_check", "zip_exists", "email_exists", "total", "total_check"])
+
+    def test_skipped_after_errors(self):
+        from gardrail import Failure
+        calls = []
+        Order = self._makeRail(calls)
+        with self.assertRaises(Failure) as c:
+            Order()({"price": -10, "amount": 2, "email": "foo", "shipping": {"zip": "123"}})
+        self.assertEqual(c.exception.errors, {"email": ["invalid email"], "price": ["negative"],
+                                              "shipping": {"zip": ["invalid zip"]}})
+        self.assertEqual(calls, ["email_format", "price_check"])
+
+        del calls[:]
+        with self.assertRaises(Failure) as c:
+            Order()({"price": 200, "amount": 2, "email": "foo@example.com", "shipping": {"zip": "1234567"}})
+        self.assertEqual(c.exception.errors, {"email": ["already registered"], "total": ["too much"]})
+
+    def test_skipped_after_errors__instrumented(self):
+        from gardrail import Failure
+        from gardrail.instrument import Key
+        calls = []
+        rail = self._makeRail(calls)()
+        with rail.instrument() as collector:
+            with self.assertRaises(Failure) as c:
+                rail({"price": -10, "amount": 2, "email": "foo", "shipping": {"zip": "123"}})
+        self.assertEqual(c.exception.errors, {"email": ["invalid email"], "price": ["negative"],
+                                              "shipping": {"zip": ["invalid zip"]}})
+        self.assertEqual(calls, ["email_format", "price_check"])
+        self.assertEqual(sorted(key.name for key in collector.stats), ["email_format", "price_check", "shipping"])
+        self.assertEqual(collector.stats[Key("Order", "email_format", ())].failures, 1)
+
+    def test_threads(self):
+        from gardrail import Failure
+        params = {"price": -10, "amount": 2, "email": "foo@example.com", "shipping": {"zip": "123"}}
+        errors = []
+        for threads in [None, 4]:
+            calls = []
+            with self.assertRaises(Failure) as c:
+                self._makeRail(calls, threads=threads)()(dict(params))
+            errors.append((list(c.exception.errors.items()), sorted(calls)))
+        self.assertEqual(errors[0], errors[1])
+
+    def test_in_place_convert(self):
+        from gardrail import Failure, convert
+        calls = []
+
+        class Person(Gardrail):
+            scheduled = True
+
+            @single("age")
+            def digits(self, age):  # checks the input of to_int
+                calls.append("digits")
+                if not age.isdigit():
+                    return NG("not a number")
+
+            @convert(["age"], path="age")
+            def to_int(self, params):
+                calls.append("to_int")
+                params["age"] = int(params["age"])
+
+            @single("age")
+            def adult(self, age):
+                calls.append("adult")
+                if age < 18:
+                    return NG("too young")
+
+        self.assertEqual(Person()({"age": "20"}), {"age": 20})
+        self.assertEqual(calls, ["digits", "to_int", "adult"])
+        del calls[:]
+        with self.assertRaises(Failure) as c:
+            Person()({"age": "x"})
+        self.assertEqual(c.exception.errors, {"age": ["not a number"]})
+        self.assertEqual(calls, ["digits"])
+
+    def test_barrier(self):
+        from gardrail import convert
+
+        class Mode(Gardrail):
+            scheduled = True
+            a = single("a")(lambda self, a: None)
+
+            @convert()
+            def code(self, params):  # may write anything
+                params["code"] = params["a"]
+
+            b = single("b")(lambda self, b: None)
+            code_check = single("code")(lambda self, code: None if code else NG("empty"))
+        self.assertEqual([len(level) for level in Mode.validators.levels], [1, 1, 2])
+
+    def test_cyclic(self):
+        from gardrail import convert, multi
+
+        class Cyclic(Gardrail):
+            scheduled = True
+            a = multi(["x", "q"])(lambda self, x, q: None)
+            b = multi(["q", "r"])(lambda self, q, r: None)
+            c = convert(["r"], path="x")(lambda self, params: None)  # a reads x after c, c after b, b after a
+        with self.assertRaises(ValueError):
+            Cyclic.validators
+
+
+@test_target("gardrail.overlay:Overlay")
+class OverlayTests(unittest.TestCase):
+    def test_it(self):
+        original = {"x": 1, "left": {"y": 1}, "right": {"y": 2}, "points": [{"z": 1}, {"z": 2}]}
+        target = self._makeOne(original)
+        target["x"] = 10
+        target["left"]["y"] = 10
+        target["points"][1]["z"] = 20
+        del target["right"]
+        self.assertEqual(target.get("x"), 10)
+        self.assertNotIn("right", target)
+        self.assertEqual(sorted(target), ["left", "points", "x"])
+
+        result = target.materialize()
+        self.assertEqual(original, {"x": 1, "left": {"y": 1}, "right": {"y": 2}, "points": [{"z": 1}, {"z": 2}]})
+        self.assertEqual(result, {"x": 10, "left": {"y": 10}, "points": [{"z": 1}, {"z": 20}]})
+        self.assertIs(result["points"][0], original["points"][0])
+
+    def test_unchanged(self):
+        original = {"left": {"y": 1}}
+        target = self._makeOne(original)
+        self.assertEqual(target["left"]["y"], 1)
+        self.assertIs(target.materialize(), original)
+
+    def test_same_results_as_without_copy_on_write(self):
+        from gardrail import Failure
+
+        class Tags(Gardrail):
+            @single("tags")
+            def not_empty(self, tags):
+                if tags == []:
+                    return NG("empty")
+
+            @single("pair")
+            def pair(self, pair):
+                if pair != ("a", "b") or pair == ["a", "b"]:
+                    return NG("not a pair")
+
+        CopyOnWrite = type("CopyOnWrite", (Tags, ), {"copy_on_write": True})
+        for cls in (Tags, CopyOnWrite):
+            with self.assertRaises(Failure) as c:
+                cls()({"tags": [], "pair": ("a", "b")})
+            self.assertEqual(c.exception.errors, {"tags": ["empty"]})
+            self.assertEqual(cls()({"tags": ["x"], "pair": ("a", "b")}), {"tags": ["x"], "pair": ("a", "b")})
+
+    def test_copy_on_write(self):
+        from gardrail import convert, container
+
+        class Mode(Gardrail):
+            copy_on_write = True
+
+            @convert(["a_code", "b_code", "mode"], strict=True)
+            def code(self, params):
+                params["code"] = params["{}_code".format(params["mode"])]
+
+            @container
+            class nested:
+                @convert(["x"])
+                def double(self, params):
+                    params["x"] = params["x"] * 2
+
+                @single("x")
+                def small(self, x):
+                    if x > 10:
+                        return NG("too large")
+
+            @container
+            class other:
+                pass
+
+        params = {"a_code": "aaaaa", "b_code": "b", "mode": "a", "nested": {"x": 2}, "other": {"x": 2}}
+        result = Mode()(params)
+        self.assertEqual(params, {"a_code": "aaaaa", "b_code": "b", "mode": "a", "nested": {"x": 2}, "other": {"x": 2}})
+        self.assertEqual(result["code"], "aaaaa")
+        self.assertEqual(result["nested"], {"x": 4})
+        self.assertIs(result["other"], params["other"])
+
+    def test_validators_receive_the_values(self):
+        # not views, copy_on_write changes only where convert writes go
+        from gardrail import Failure, multi, container, convert
+        seen = []
+
+        class Kinds(Gardrail):
+            copy_on_write = True
+
+            @multi(["meta", "tags"])
+            def kinds(self, meta, tags):
+                seen.append((meta, tags))
+                if not (isinstance(meta, dict) and isinstance(tags, list)):
+                    return NG("not a dict and a list")
+
+            @container
+            class nested:
+                @convert(["x"])
+                def double(self, params):
+                    params["x"] = params["x"] * 2
+
+            @single("nested")
+            def converted(self, nested):
+                if not isinstance(nested, dict) or nested["x"] != 4:
+                    return NG("not converted")
+
+        params = {"meta": {"a": 1}, "tags": ["x"], "nested": {"x": 2}}
+        Interpreted = type("Interpreted", (Kinds, ), {"scheduled": True})
+        for cls in (Kinds, Interpreted):
+            result = cls()(params)
+            self.assertEqual(result["nested"], {"x": 4})
+            self.assertIs(seen[-1][0], params["meta"])
+            self.assertIs(seen[-1][1], params["tags"])
+        self.assertEqual(params["nested"], {"x": 2})
+        with self.assertRaises(Failure):
+            Kinds()({"meta": [], "tags": ["x"]})
+
+
+@test_target("gardrail.stream:stream_object")
+class StreamTests(unittest.TestCase):
+    def _makeRail(self):
+        from gardrail import collection
+
+        class PointList(Gardrail):
+            @collection
+            class points:
+                @single("x")
+                def positive(self, x):
+                    if x < 0:
+                        return NG("negative")
+        return PointList()
+
+    def test_it(self):
+        import io
+        fp = io.StringIO(u'{"name": "foo", "points": [{"x": 10}, {"x": -1}, {"x": 123456}, [], {"x": -2}], "size": 5}')
+        params = self._makeOne(fp, "points", chunksize=4)
+        self.assertEqual(params["name"], "foo")
+        self.assertEqual(list(params["points"]), [{"x": 10}, {"x": -1}, {"x": 123456}, [], {"x": -2}])
+        self.assertEqual(params["size"], 5)
+
+    def test_fields_after_the_array(self):
+        import io
+        from gardrail import collection
+
+        class Named(Gardrail):
+            @single("name", strict=True)
+            def name_check(self, name):
+                if not name:
+                    return NG("empty")
+
+            @collection
+            class points:
+                pass
+
+            @single("size")
+            def size_check(self, size):  # after the collection
+                if size < 0:
+                    return NG("negative")
+
+        data = u'{"points": [{"x": 1}], "name": "n", "size": 1}'
+        with self.assertRaises(ValueError) as c:
+            Named()(self._makeOne(io.StringIO(data), "points"))
+        assert_regex(self, str(c.exception), "the field 'name' is after the array 'points'")
+
+        data = u'{"name": "n", "points": [{"x": 1}], "size": -1}'
+        self.assertEqual(list(Named().iter_errors(self._makeOne(io.StringIO(data), "points"))),
+                         [(("size", ), "negative")])
+
+    def test_collection_consumes_iterator(self):
+        import io
+        from gardrail import Failure
+        data = u'{"points": [' + u", ".join(u'{{"x": {}}}'.format(-i if i % 3 == 0 else i) for i in range(1, 10)) + u']}'
+        with self.assertRaises(Failure) as c:
+            self._makeRail()(self._makeOne(io.StringIO(data), "points", chunksize=7))
+        self.assertEqual(c.exception.errors, {"points": {2: {"x": ["negative"]}, 5: {"x": ["negative"]},
+                                                         8: {"x": ["negative"]}}})
+
+    def test_fail_fast_stops_reading(self):
+        consumed = []
+
+        def points():
+            for i in range(100):
+                consumed.append(i)
+                yield {"x": -1 if i == 3 else i}
+
+        errors = list(self._makeRail().iter_errors({"points": points()}, fail_fast=True))
+        self.assertEqual(errors, [(("points", 3, "x"), "negative")])
+        self.assertEqual(consumed, [0, 1, 2, 3])
+
+
+@test_target("gardrail.subtree:SubtreeCache")
+class SubtreeCacheTests(unittest.TestCase):
+    def _makeRail(self, option, calls):
+        from gardrail import container, collection, subrail
+
+        class Address(Gardrail):
+            subtree_cache = option
+
+            @single("zip")
+            def zip(self, value):
+                calls.append(value)
+                if len(value) != 7:
+                    return NG("invalid zip")
+
+        class Order(Gardrail):
+            billing = subrail("billing")(Address)
+            shipping = subrail("shipping")(Address)
+
+            @collection
+            class items:
+                subtree_cache = option
+
+                @single("qty")
+                def qty(self, value):
+                    calls.append(value)
+                    if value <= 0:
+                        return NG("not positive")
+
+            @container
+            class note:
+                subtree_cache = option
+
+                @single("text")
+                def text(self, value):
+                    calls.append(value)
+                    if not value:
+                        return NG("empty")
+        return Order()
+
+    def test_same_object_in_a_call(self):
+        from gardrail import Failure
+        calls = []
+        address = {"zip": "123"}
+        item = {"qty": 0}
+        params = {"billing": address, "shipping": address, "items": [item, {"qty": 1}, item], "note": {"text": ""}}
+        with self.assertRaises(Failure) as c:
+            self._makeRail(True, calls)(params)
+        self.assertEqual(c.exception.errors, {
+            "billing": {"zip": ["invalid zip"]}, "shipping": {"zip": ["invalid zip"]},
+            "items": {0: {"qty": ["not positive"]}, 2: {"qty": ["not positive"]}},
+            "note": {"text": ["empty"]}})
+        self.assertEqual(calls, ["123", 0, 1, ""])
+
+        # not cached across calls
+        with self.assertRaises(Failure):
+            self._makeRail(True, calls)(params)
+        self.assertEqual(len(calls), 8)
+
+    def test_structure_across_calls(self):
+        calls = []
+        rail = self._makeRail(16, calls)
+        params = {"billing": {"zip": "1234567"}, "shipping": {"zip": "1234567"},
+                  "items": [{"qty": 1}, {"qty": 1}], "note": {"text": "x"}}
+        rail(params)
+        self.assertEqual(calls, ["1234567", 1, "x"])
+        rail({"billing": {"zip": "1234567"}, "items": [{"qty": 1}, {"qty": 2}], "note": {"text": "x"}})
+        self.assertEqual(calls, ["1234567", 1, "x", 2])
+        info = rail.__class__.validators[0].subtrees.cache_info()
+        self.assertEqual((info.hits, info.misses, info.currsize), (2, 1, 1))
+
+    def test_error_budget(self):
+        calls = []
+        address = {"zip": "123"}
+        params = {"billing": address, "shipping": address, "items": [], "note": {"text": "x"}}
+        errors = list(self._makeRail(16, calls).iter_errors(params, max_errors=1))
+        self.assertEqual(errors, [(("billing", "zip"), "invalid zip")])
+        errors = list(self._makeRail(16, calls).iter_errors(params, max_errors=2))
+        self.assertEqual(errors, [(("billing", "zip"), "invalid zip"), (("shipping", "zip"), "invalid zip")])
+
+    def test_unhashable_is_validated(self):
+        calls = []
+        rail = self._makeRail(16, calls)
+        params = {"items": [{"qty": 1, "tags": set()}, {"qty": 1, "tags": set()}], "note": {"text": "x"}}
+        rail(params)
+        rail(params)
+        self.assertEqual(calls, [1, 1, "x", 1, 1])  # note is cached
+
+
+@test_target("gardrail:Gardrail")
+class AllocationTests(unittest.TestCase):
+    """validating a valid document again allocates (almost) nothing in gardrail"""
+
+    def _makeRail(self, kind):
+        from gardrail import multi, matched, share, container, collection, subrail, dispatch, dispatch_on
+
+        def ok(self, *args):
+            return None
+
+        class Leaf(Gardrail):
+            x = single("x")(ok)
+
+        leaf = Leaf()
+
+        def check_child(self, check, params):
+            check(leaf, params["c"], "c")
+
+        if kind == "share":  # share() adds the validators to the class body calling it
+            class Shared(Gardrail):
+                v = share(single("x"), single("y"))(ok)
+            self.assertEqual(len(Shared.validators), 2)
+            return Shared(), {"x": 1, "y": 2}
+
+        validator, params = {
+            "single": (lambda: single("x")(ok), {"x": 1}),
+            "missing": (lambda: single("y")(ok), {"x": 1}),
+            "multi": (lambda: multi(["x", "y"])(ok), {"x": 1, "y": 2}),
+            "matched": (lambda: matched(["x", "y"], path="x")(ok), {"x": 1, "y": 2}),
+            "container": (lambda: container(type("c", (object, ), {"x": single("x")(ok)})), {"c": {"x": 1}}),
+            "collection": (lambda: collection(type("c", (object, ), {"x": single("x")(ok)})), {"c": [{"x": 1}] * 10}),
+            "subrail": (lambda: subrail("c")(Leaf), {"c": {"x": 1}}),
+            "dispatch_on": (lambda: dispatch_on("t", {"leaf": Leaf}), {"t": "leaf", "x": 1}),
+            "dispatch": (lambda: dispatch()(check_child), {"c": {"x": 1}}),
+        }[kind]
+        return type("Rail", (Gardrail, ), {"v": validator()})(), params
+
+    def _peak(self, fn, n=20):
+        import gc
+        import tracemalloc
+        for _ in range(3):
+            fn()
+        gc.collect()
+        tracemalloc.start()
+        try:
+            fn()
+            base = tracemalloc.get_traced_memory()[0]
+            tracemalloc.reset_peak()
+            for _ in range(n):
+                fn()
+            return tracemalloc.get_traced_memory()[1] - base
+        finally:
+            tracemalloc.stop()
+
+    def test_it(self):
+        try:
+            import tracemalloc
+            tracemalloc.reset_peak
+        except (ImportError, AttributeError):  # python < 3.9
+            self.skipTest("tracemalloc.reset_peak() is not available")
+
+        # bytes at the peak of repeated calls, mostly the interpreter's own
+        budgets = {"collection": 512, "dispatch": 1024}
+        for kind in ["single", "missing", "multi", "matched", "share", "container", "collection", "subrail",
+                     "dispatch_on", "dispatch"]:
+            rail, params = self._makeRail(kind)
+            peak = self._peak(lambda: rail.validate(params))
+            self.assertLessEqual(peak, budgets.get(kind, 256), kind)
+
+
+@test_target("gardrail.cli:main")
+class CliTests(unittest.TestCase):
+    def _callFUT(self, argv, data):
+        import io
+        stdout, stderr = io.StringIO(), io.StringIO()
+        status = self._getTarget()(argv, stdin=io.BytesIO(data), stdout=stdout, stderr=stderr)
+        return status, stdout.getvalue(), stderr.getvalue()
+
+    def test_it(self):
+        import json
+        data = b'{"email": "foo@example.com"}\n{"email": "a@example.com"}\nnot json\n\n{"email": "foo@example.com"}\n'
+        argv = ["gardrail.tests.test_it:_Registration", "--args", '[["foo@example.com"]]']
+        status, out, err = self._callFUT(argv, data)
+        self.assertEqual(status, 1)
+        lines = [json.loads(line) for line in out.splitlines()]
+        self.assertEqual([line["line"] for line in lines], [1, 3, 5])
+        self.assertEqual(lines[0]["errors"], {"email": ["already registered"]})
+        self.assertIn("__json__", lines[1]["errors"])
+        assert_regex(self, err, "records: 4, invalid: 3, errors: 3")
+
+    def test_not_objects(self):
+        import json
+        data = b'1\nnull\n["a@example.com"]\n{"email": "foo@example.com"}\n'
+        argv = ["gardrail.tests.test_it:_Registration", "--args", '[["foo@example.com"]]']
+        status, out, err = self._callFUT(argv, data)
+        self.assertEqual(status, 1)
+        lines = [json.loads(line) for line in out.splitlines()]
+        self.assertEqual([line["line"] for line in lines], [1, 2, 3, 4])
+        self.assertEqual(lines[0]["errors"], {"__json__": ["not an object"]})
+        assert_regex(self, err, "records: 4, invalid: 4, errors: 4")
+
+        status, out, err = self._callFUT(["--json"] + argv, b'[{"email": "a@example.com"}, 1]')
+        self.assertEqual([json.loads(line) for line in out.splitlines()],
+                         [{"line": 2, "errors": {"__json__": ["not an object"]}}])
+
+    def test_fail_fast(self):
+        data = b'{"email": "a@example.com"}\n{"email": "foo@example.com"}\n{"email": "foo@example.com"}\n'
+        argv = ["gardrail.tests.test_it:_Registration", "--args", '[["foo@example.com"]]', "--fail-fast"]
+        status, out, err = self._callFUT(argv, data)
+        self.assertEqual(len(out.splitlines()), 1)
+        assert_regex(self, err, "records: 2, invalid: 1")
+
+    def test_success(self):
+        data = b'[{"email": "a@example.com"}, {"email": "b@example.com"}]'
+        argv = ["--json", "gardrail.tests.test_it:_Registration", "--args", "[[]]"]
+        status, out, err = self._callFUT(argv, data)
+        self.assertEqual((status, out), (0, ""))
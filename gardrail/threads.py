@@ -0,0 +1,91 @@
+# -*- coding:utf-8 -*-
+"""
+running blocking validators on a shared thread pool.
+
+each task is validated with its own context (params, path, errors and status), and the results
+are merged into the parent context in the order of the tasks, so the errors are the same as sequential validation.
+
+- ``threads = N`` on a collection class runs its elements on the pool
+- ``threads = N`` on a Gardrail class runs its validators on the pool (convert is a barrier)
+"""
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from . import Convert, fork_context, merge_errors, validate_all
+
+_pools = {}
+_lock = threading.Lock()
+_local = threading.local()
+
+
+def thread_pool(workers):
+    """the shared pool of the size"""
+    pool = _pools.get(workers)
+    if pool is None:
+        with _lock:
+            pool = _pools.get(workers)
+            if pool is None:
+                pool = _pools[workers] = ThreadPoolExecutor(max_workers=workers)
+    return pool
+
+
+def _run(context, validators):
+    _local.worker = True
+    try:
+        validate_all(context, validators)
+    finally:
+        _local.worker = False
+    return context
+
+
+def merge(context, forked):
+    merge_errors(context, forked.errors.entries, spent=forked.status.budget == 0, origins=forked.errors.origins)
+
+
+def run_threaded(context, workers, jobs):
+    """jobs are (validators, params, path), validated concurrently and merged in order
+
+    returns the status of each job (True if no errors are found, None if it is not merged)
+    """
+    results = [None] * len(jobs)
+    if getattr(_local, "worker", False):  # nested, not to wait for the pool in the pool
+        for i, (validators, params, path) in enumerate(jobs):
+            forked = _run(fork_context(context, params, path), validators)
+            merge(context, forked)
+            results[i] = forked.status.status
+            if context.status.budget == 0:
+                break
+        return results
+
+    pool = thread_pool(workers)
+    futures = [pool.submit(_run, fork_context(context, params, path), validators) for validators, params, path in jobs]
+    for i, future in enumerate(futures):
+        if context.status.budget == 0:
+            future.cancel()
+            continue
+        forked = future.result()
+        merge(context, forked)
+        results[i] = forked.status.status
+    return results
+
+
+def threaded_plan(cls):
+    """a plan running the validators of cls on the pool, convert is run alone"""
+    groups = []
+    for v in cls.validators:
+        if isinstance(v, Convert):
+            groups.append(v)
+        elif groups and isinstance(groups[-1], list):
+            groups[-1].append(v)
+        else:
+            groups.append([v])
+
+    def plan(scope, context):
+        for group in groups:
+            if isinstance(group, Convert):
+                group.validate_context(context)
+            else:
+                run_threaded(context, cls.threads, [([v], context.params, list(context.path)) for v in group])
+            if context.status.budget == 0:
+                return
+    plan.source = None
+    return plan
@@ -23,6 +23,10 @@ install_requires = [
 docs_extras = [
 ]
 
+numpy_extras = [
+    'numpy'
+]
+
 tests_require = [
     'evilunit'
 ]
@@ -49,9 +53,12 @@ setup(name='gardrail',
       extras_require={
           'testing': testing_extras,
           'docs': docs_extras,
+          'numpy': numpy_extras,
       },
       tests_require=tests_require,
       test_suite="gardrail.tests",
       entry_points="""
+[console_scripts]
+gardrail = gardrail.cli:main
 """)
 